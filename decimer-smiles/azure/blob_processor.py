@@ -3,120 +3,125 @@
 DECIMER Blob Processor - Using PostgreSQL for coordination
 
 Monitors CPU/memory usage and spawns workers when resources available.
-Workers coordinate via PostgreSQL for atomic locking.
+Each worker is a long-lived process that locks and processes directories
+one after another via PostgreSQL, loading DECIMER only once.
 """
 
 import os
 import sys
+import time
+import queue
+import atexit
+import threading
 import subprocess
 import socket
 import psutil
-
-import psycopg2
+from psycopg2.extras import execute_values
 
 # Import config
-from db_config import DB_CONFIG
+from db_config import get_conn
 
 VM_ID = socket.gethostname()
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'worker.py')
+
+
+# Logs are queued and written by a background thread so the control loop
+# never waits on the database
+LOG_QUEUE = queue.Queue()
+LOG_BATCH_SIZE = 200
+
+
+def _log_drainer():
+    """Write queued log rows to the database in batches."""
+    while True:
+        batch = [LOG_QUEUE.get()]
+        while len(batch) < LOG_BATCH_SIZE:
+            try:
+                batch.append(LOG_QUEUE.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            with get_conn() as conn, conn.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO logs (worker_id, directory, level, message)
+                    VALUES %s
+                """, batch)
+        except:
+            pass  # Don't fail if logging fails
+        finally:
+            for _ in batch:
+                LOG_QUEUE.task_done()
+
+
+def flush_logs():
+    """Block until every queued log row has been written (or dropped)."""
+    LOG_QUEUE.join()
+
+
+threading.Thread(target=_log_drainer, daemon=True).start()
+atexit.register(flush_logs)
 
 
 def log_to_db(level: str, message: str):
-    """Log message to database."""
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        conn.autocommit = True
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO logs (worker_id, directory, level, message)
-            VALUES (%s, %s, %s, %s)
-        """, (VM_ID, 'processor', level, message))
-        cur.close()
-        conn.close()
-    except:
-        pass  # Don't fail if logging fails
+    """Queue a log message for the database."""
+    LOG_QUEUE.put((VM_ID, 'processor', level, message))
 
 # Configuration - Keep below 80% usage
 CPU_THRESHOLD = 60
 MEMORY_THRESHOLD = 60
 CHECK_INTERVAL = 10
+# Resource readings younger than this are reused within a loop iteration
+RESOURCE_CACHE_TTL = CHECK_INTERVAL / 2
 # Each worker uses ~2 cores when processing. To stay under 80%: max_workers = (cores * 0.8) / 2
 import multiprocessing
 MAX_WORKERS = max(1, int(multiprocessing.cpu_count() * 0.8 / 2))
 
 
-def get_db_connection():
-    """Get PostgreSQL connection."""
-    return psycopg2.connect(**DB_CONFIG)
-
-
-def find_and_lock_available(worker_id: str) -> str | None:
-    """Find and atomically lock an available synthesis directory."""
-    conn = get_db_connection()
-    conn.autocommit = True
-    cur = conn.cursor()
-
-    try:
-        # Atomic: find pending or expired-lock, lock it, return name
-        cur.execute("""
-            UPDATE synthesis
-            SET status = 'locked',
-                locked_by = %s,
-                locked_at = NOW()
-            WHERE name = (
-                SELECT name FROM synthesis
-                WHERE status = 'pending'
-                   OR (status = 'locked' AND locked_at < NOW() - INTERVAL '5 minutes')
-                ORDER BY name
-                LIMIT 1
-                FOR UPDATE SKIP LOCKED
-            )
-            RETURNING name
-        """, (worker_id,))
-
-        result = cur.fetchone()
-        return result[0] if result else None
-    finally:
-        cur.close()
-        conn.close()
+STATS_COLUMNS_SQL = """
+    COUNT(*) as total,
+    COUNT(*) FILTER (WHERE status = 'completed') as completed,
+    COUNT(*) FILTER (WHERE status = 'pending') as pending,
+    COUNT(*) FILTER (WHERE status = 'locked') as locked,
+    COUNT(*) FILTER (WHERE status = 'failed') as failed,
+    COUNT(*) FILTER (WHERE status = 'pending'
+                        OR (status = 'locked' AND locked_at < NOW() - INTERVAL '5 minutes')) as available
+"""
+
+
+def _stats_from_row(row) -> dict:
+    """Build the stats dict from (total, completed, pending, locked, failed, available)."""
+    return {
+        'total': row[0],
+        'completed': row[1],
+        'pending': row[2],
+        'locked': row[3],
+        'failed': row[4],
+        'available': row[5],  # lockable now: pending or expired lock
+        'remaining': row[2] + row[3]  # pending + locked
+    }
 
 
 def get_stats() -> dict:
     """Get processing statistics from PostgreSQL."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    try:
-        cur.execute("""
-            SELECT
-                COUNT(*) as total,
-                COUNT(*) FILTER (WHERE status = 'completed') as completed,
-                COUNT(*) FILTER (WHERE status = 'pending') as pending,
-                COUNT(*) FILTER (WHERE status = 'locked') as locked,
-                COUNT(*) FILTER (WHERE status = 'failed') as failed
-            FROM synthesis
-        """)
-        row = cur.fetchone()
-        return {
-            'total': row[0],
-            'completed': row[1],
-            'pending': row[2],
-            'locked': row[3],
-            'failed': row[4],
-            'remaining': row[2] + row[3]  # pending + locked
-        }
-    finally:
-        cur.close()
-        conn.close()
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT {STATS_COLUMNS_SQL} FROM synthesis")
+        return _stats_from_row(cur.fetchone())
+
+
+_resource_cache = None  # (monotonic timestamp, cpu, mem)
 
 
 def get_resources() -> tuple[float, float]:
-    """Get average CPU and memory usage over 5 seconds."""
-    cpu_samples = []
-    mem_samples = []
-    for _ in range(5):
-        cpu_samples.append(psutil.cpu_percent(interval=1))
-        mem_samples.append(psutil.virtual_memory().percent)
-    return sum(cpu_samples) / 5, sum(mem_samples) / 5
+    """Get CPU and memory usage, reusing a reading younger than RESOURCE_CACHE_TTL.
+
+    cpu_percent(interval=None) is non-blocking and reports usage since the
+    previous call, so it needs one blocking seed call at startup.
+    """
+    global _resource_cache
+    now = time.monotonic()
+    if _resource_cache is None or now - _resource_cache[0] >= RESOURCE_CACHE_TTL:
+        _resource_cache = (now, psutil.cpu_percent(interval=None), psutil.virtual_memory().percent)
+    return _resource_cache[1], _resource_cache[2]
 
 
 def can_spawn() -> bool:
@@ -125,66 +130,58 @@ def can_spawn() -> bool:
     return cpu < CPU_THRESHOLD and mem < MEMORY_THRESHOLD
 
 
-def preload_decimer_models():
-    """Pre-load DECIMER models to avoid race conditions when workers spawn."""
-    log_to_db('INFO', "Pre-loading DECIMER models...")
-    try:
-        from DECIMER import predict_SMILES
-        log_to_db('INFO', "DECIMER models loaded successfully")
-    except Exception as e:
-        log_to_db('ERROR', f"Failed to load DECIMER models: {e}")
-        raise
-
-
 def main():
-    # Pre-load models BEFORE spawning any workers
-    preload_decimer_models()
+    # Seed psutil's CPU counters so later non-blocking reads are meaningful
+    psutil.cpu_percent(interval=1)
 
     stats = get_stats()
     log_to_db('INFO', f"Starting: {stats['total']} total, {stats['completed']} done, {stats['pending']} pending (max {MAX_WORKERS} workers)")
 
-    # Track running processes
-    processes = {}  # pid -> (directory, process)
+    # Track running workers
+    processes = {}  # pid -> (worker_id, process)
     worker_num = 0
 
-    import time
+    # Ticks are scheduled against a monotonic deadline so loop body latency
+    # does not stretch the interval between status updates
+    next_tick = time.monotonic()
 
     while True:
         try:
-            # Check completed processes
+            # Check exited workers
             for pid in list(processes.keys()):
-                directory, proc = processes[pid]
+                worker_id, proc = processes[pid]
                 if proc.poll() is not None:
                     if proc.returncode == 0:
-                        log_to_db('INFO', f"Completed: {directory}")
+                        log_to_db('INFO', f"Worker exited: {worker_id}")
                     else:
-                        log_to_db('ERROR', f"Failed: {directory} (exit code {proc.returncode})")
+                        log_to_db('ERROR', f"Worker failed: {worker_id} (exit code {proc.returncode})")
                     del processes[pid]
 
-            # Spawn new worker if resources allow AND under max workers
-            if can_spawn() and len(processes) < MAX_WORKERS:
-                worker_id = f"{VM_ID}-{worker_num}"
-
-                # Atomically find and lock a directory
-                directory = find_and_lock_available(worker_id)
-
-                if directory:
-                    worker_num += 1
+            stats = get_stats()
 
-                    # Spawn separate process
-                    script_dir = os.path.dirname(os.path.abspath(__file__))
-                    proc = subprocess.Popen(
-                        [sys.executable, '-u', 'worker.py', directory, worker_id],
-                        cwd=script_dir,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.STDOUT
-                    )
-                    processes[proc.pid] = (directory, proc)
-                    log_to_db('INFO', f"Spawned {worker_id} for {directory}")
+            # Spawn another worker if there is lockable work, resources allow
+            # AND under max workers. Workers lock directories themselves.
+            if stats['available'] > 0 and can_spawn() and len(processes) < MAX_WORKERS:
+                worker_id = f"{VM_ID}-{worker_num}"
+                worker_num += 1
+
+                # Spawn separate process. Absolute script path (no cwd=) and
+                # close_fds=False let CPython use posix_spawn (vfork+exec)
+                # instead of fork; our own fds are non-inheritable anyway.
+                # Output is discarded: nothing reads it, and an undrained
+                # pipe would block the worker once its buffer fills.
+                # Workers report through log_to_db instead.
+                proc = subprocess.Popen(
+                    [sys.executable, '-u', WORKER_SCRIPT, worker_id],
+                    close_fds=False,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL
+                )
+                processes[proc.pid] = (worker_id, proc)
+                log_to_db('INFO', f"Spawned {worker_id}")
 
             # Status update
             cpu, mem = get_resources()
-            stats = get_stats()
             log_to_db('INFO', f"Status: {stats['completed']}/{stats['total']} done | {len(processes)} workers | CPU: {cpu:.0f}% | MEM: {mem:.0f}%")
 
             # Check if all done
@@ -195,7 +192,10 @@ def main():
         except Exception as e:
             log_to_db('ERROR', f"Loop error (retrying): {e}")
 
-        time.sleep(CHECK_INTERVAL)
+        # If the body overran a whole interval, skip the missed ticks instead of bursting
+        now = time.monotonic()
+        next_tick = max(next_tick + CHECK_INTERVAL, now)
+        time.sleep(next_tick - now)
 
 
 if __name__ == '__main__':
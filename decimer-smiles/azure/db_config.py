@@ -1,6 +1,11 @@
 import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
+from psycopg2.extensions import connection as _PgConnection
+from psycopg2.pool import ThreadedConnectionPool
+
 # Load .env file if it exists
 env_file = Path(__file__).parent / '.env'
 if env_file.exists():
@@ -28,3 +33,71 @@ DB_CONFIG = {
 # Azure Blob Storage
 BLOB_CONNECTION_STRING = os.environ.get('BLOB_CONNECTION_STRING', '')
 BLOB_CONTAINER = os.environ.get('BLOB_CONTAINER', 'chemistry-data')
+
+# Per-process connection pool, created on first use so importing this module
+# never opens a connection. Borrowing from the pool skips the TLS + auth
+# handshake that a fresh psycopg2.connect() pays against Azure Postgres.
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 4
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PreparingConnection(_PgConnection):
+    """psycopg2 connection that remembers which statements it has PREPAREd."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+def prepare_once(cur, name: str, sql: str):
+    """PREPARE sql as name on the cursor's connection unless already done there.
+
+    name may carry a parameter type list, e.g. "upsert(int, text)"; the
+    statement is remembered by the part before the parenthesis.
+    """
+    conn = cur.connection
+    key = name.split('(', 1)[0].strip()
+    if key not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {sql}")
+        conn.prepared.add(key)
+
+
+def execute_prepared(cur, name: str, sql: str, params: tuple):
+    """Execute sql as a server-side prepared statement.
+
+    The statement is PREPAREd on the cursor's connection the first time it is
+    used there, so the server parses and plans it once per connection rather
+    than once per call. sql uses $1, $2, ... placeholders.
+    """
+    prepare_once(cur, name, sql)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+
+
+def get_pool():
+    """Get the process-wide ThreadedConnectionPool, creating it if needed."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(POOL_MIN_CONN, POOL_MAX_CONN,
+                                               connection_factory=PreparingConnection,
+                                               **DB_CONFIG)
+    return _pool
+
+
+@contextmanager
+def get_conn():
+    """Borrow an autocommit connection from the pool and return it afterwards.
+
+    Connections that were closed (e.g. server dropped them) are discarded
+    instead of being handed back out.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        conn.autocommit = True
+        yield conn
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
@@ -4,22 +4,27 @@
 import os
 from pathlib import Path
 import psycopg2
+from psycopg2.extras import execute_values
 from db_config import DB_CONFIG
 
 LOCAL_PATH = Path("/mnt/d/chemistry-scraped")
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg'})
 
 def main():
     # Count images in each output folder locally
+    # os.scandir yields DirEntry objects: name and is_dir() come from the
+    # directory listing itself, without a Path object or stat() per file
     counts = {}
-    for d in LOCAL_PATH.iterdir():
-        if d.is_dir():
-            output_dir = d / "output"
-            if output_dir.exists():
-                count = sum(1 for f in output_dir.iterdir()
-                           if f.suffix.lower() in ('.png', '.jpg', '.jpeg'))
-            else:
-                count = 0
-            counts[d.name] = count
+    with os.scandir(LOCAL_PATH) as entries:
+        for d in entries:
+            if d.is_dir():
+                try:
+                    with os.scandir(os.path.join(d.path, "output")) as files:
+                        count = sum(1 for f in files
+                                    if os.path.splitext(f.name)[1].lower() in IMAGE_EXTENSIONS)
+                except FileNotFoundError:
+                    count = 0
+                counts[d.name] = count
 
     print(f"Counted {len(counts)} directories, {sum(counts.values())} total images")
 
@@ -27,12 +32,17 @@ def main():
     conn = psycopg2.connect(**DB_CONFIG)
     cur = conn.cursor()
 
-    # Use executemany for speed
+    # One UPDATE ... FROM (VALUES ...) per page, not one statement per row
     data = [(count, name) for name, count in counts.items()]
-    cur.executemany("UPDATE synthesis SET image_count = %s WHERE name = %s", data)
+    updated = execute_values(cur, """
+        UPDATE synthesis SET image_count = data.image_count
+        FROM (VALUES %s) AS data(image_count, name)
+        WHERE synthesis.name = data.name
+        RETURNING synthesis.id
+    """, data, page_size=5000, fetch=True)
 
     conn.commit()
-    print(f"Updated {cur.rowcount} rows")
+    print(f"Updated {len(updated)} rows")
 
     cur.close()
     conn.close()
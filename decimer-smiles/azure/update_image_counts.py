@@ -1,48 +1,90 @@
 #!/usr/bin/env python3
 """Update database with correct image counts from output folders."""
 
+import asyncio
+
 import psycopg2
-from azure.storage.blob import BlobServiceClient
+from psycopg2.extras import execute_values
+from azure.storage.blob.aio import BlobServiceClient
 from db_config import DB_CONFIG, BLOB_CONNECTION_STRING, BLOB_CONTAINER
 
-def main():
-    # Connect to blob storage
-    blob_service = BlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING)
-    container = blob_service.get_container_client(BLOB_CONTAINER)
+# Number of directory listings in flight at once
+CONCURRENCY = 64
 
-    # Connect to database
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor()
 
-    # Get all synthesis directories
-    cur.execute("SELECT name FROM synthesis ORDER BY name")
-    directories = [row[0] for row in cur.fetchall()]
+async def count_images(container, directory: str, sem: asyncio.Semaphore) -> tuple[str, int]:
+    """Count images in a directory's output folder (None if listing it failed)."""
+    async with sem:
+        prefix = f"{directory}/output/"
+        count = 0
+        try:
+            async for blob in container.list_blobs(name_starts_with=prefix):
+                if blob.name.lower().endswith(('.png', '.jpg', '.jpeg')):
+                    count += 1
+        except Exception as e:
+            # Skip this directory; its stored count is left as it was
+            print(f"Failed to list {prefix}: {e}")
+            return directory, None
+        return directory, count
 
-    print(f"Updating image counts for {len(directories)} directories...")
 
+async def count_all(directories: list[str]) -> list[tuple[str, int]]:
+    """List all output folders concurrently, printing progress every 100 directories.
+
+    Returns (directory, count) for the directories that were listed successfully.
+    """
+    sem = asyncio.Semaphore(CONCURRENCY)
+    results = []
     total_images = 0
-    for i, directory in enumerate(directories):
-        # Count images in output folder
-        prefix = f"{directory}/output/"
-        count = 0
-        for blob in container.list_blobs(name_starts_with=prefix):
-            if blob.name.lower().endswith(('.png', '.jpg', '.jpeg')):
-                count += 1
 
-        # Update database
-        cur.execute("UPDATE synthesis SET image_count = %s WHERE name = %s", (count, directory))
-        total_images += count
+    async with BlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING) as blob_service:
+        container = blob_service.get_container_client(BLOB_CONTAINER)
+        tasks = [count_images(container, d, sem) for d in directories]
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            directory, count = await task
+            if count is not None:
+                results.append((directory, count))
+                total_images += count
+
+            if done % 100 == 0:
+                print(f"Progress: {done}/{len(directories)} - Total images so far: {total_images}")
 
-        if (i + 1) % 100 == 0:
-            print(f"Progress: {i+1}/{len(directories)} - Total images so far: {total_images}")
-            conn.commit()
+    return results
+
+
+def main():
+    # Get all synthesis directories
+    conn = psycopg2.connect(**DB_CONFIG)
+    with conn.cursor() as cur:
+        cur.execute("SELECT name FROM synthesis ORDER BY name")
+        directories = [row[0] for row in cur.fetchall()]
+    conn.close()
+
+    print(f"Updating image counts for {len(directories)} directories...")
+
+    # No connection is held open while the listing runs
+    results = asyncio.run(count_all(directories))
+    total_images = sum(count for _, count in results)
+    skipped = len(directories) - len(results)
+    if skipped:
+        print(f"Skipped {skipped} directories that could not be listed")
+
+    # Update database in one batched statement per page
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+    execute_values(cur, """
+        UPDATE synthesis SET image_count = data.image_count
+        FROM (VALUES %s) AS data(name, image_count)
+        WHERE synthesis.name = data.name
+    """, results, page_size=1000)
 
     conn.commit()
     cur.close()
     conn.close()
 
     print(f"\nDone! Total images in output folders: {total_images}")
-    print(f"Average per directory: {total_images / len(directories):.1f}")
+    if results:
+        print(f"Average per directory: {total_images / len(results):.1f}")
 
 if __name__ == '__main__':
     main()
@@ -1,88 +1,184 @@
 #!/usr/bin/env python3
 """
-Worker script - processes a single directory using PostgreSQL for coordination
-Usage: python worker.py <directory_name> <worker_id>
+Worker script - processes synthesis directories using PostgreSQL for coordination
+
+Usage:
+    python worker.py <worker_id>                    # lock and process directories until none are left
+    python worker.py <directory_name> <worker_id>   # process one directory already locked by worker_id
+
+In the first form the worker stays alive across directories, so TensorFlow
+and the DECIMER model are loaded once per process rather than once per
+directory.
 """
 
 import sys
 import time
-import tempfile
+import socket
+import threading
 import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from itertools import islice
 from pathlib import Path
 
-import psycopg2
+import numpy as np
+from PIL import Image
+from psycopg2.extras import execute_values
 from azure.storage.blob import BlobServiceClient
 
 # Import config
-from db_config import DB_CONFIG, BLOB_CONNECTION_STRING, BLOB_CONTAINER
+from db_config import get_conn, execute_prepared, BLOB_CONNECTION_STRING, BLOB_CONTAINER
+
+# Number of SMILES results to accumulate before flushing to the database
+BATCH_SIZE = 500
+# Seconds between lock refreshes (lock expires after 5 minutes)
+HEARTBEAT_INTERVAL = 60
+# Concurrent blob downloads per worker
+DOWNLOAD_WORKERS = 16
+# Decoded images kept ready ahead of inference
+PREFETCH_DEPTH = 32
+# Advisory lock key serializing DECIMER's first-time model download per VM
+DECIMER_LOAD_LOCK = f"decimer-load:{socket.gethostname()}"
 
 
 def log_to_db(worker_id: str, directory: str, level: str, message: str, tb: str = None):
     """Log message to database."""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        conn.autocommit = True
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO logs (worker_id, directory, level, message, traceback)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (worker_id, directory, level, message, tb))
-        cur.close()
-        conn.close()
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO logs (worker_id, directory, level, message, traceback)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (worker_id, directory, level, message, tb))
     except:
         pass  # Don't fail if logging fails
 
 
-def get_db_connection():
-    """Get PostgreSQL connection."""
-    return psycopg2.connect(**DB_CONFIG)
-
-
 def get_synthesis_id(directory: str) -> int:
     """Get synthesis ID from directory name."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
+    with get_conn() as conn, conn.cursor() as cur:
         cur.execute("SELECT id FROM synthesis WHERE name = %s", (directory,))
         result = cur.fetchone()
         return result[0] if result else None
-    finally:
-        cur.close()
-        conn.close()
+
+
+def find_and_lock_available(worker_id: str) -> str | None:
+    """Find and atomically lock an available synthesis directory."""
+    with get_conn() as conn, conn.cursor() as cur:
+        # Atomic: find pending or expired-lock, lock it, return name.
+        # One ordered LIMIT 1 probe per partial index instead of an OR, which
+        # would have to combine both indexes and sort every candidate;
+        # LEAST skips a NULL (no candidate) from either probe
+        execute_prepared(cur, 'find_and_lock', """
+            UPDATE synthesis
+            SET status = 'locked',
+                locked_by = $1,
+                locked_at = NOW()
+            WHERE name = LEAST(
+                (SELECT name FROM synthesis
+                 WHERE status = 'pending'
+                 ORDER BY name
+                 LIMIT 1
+                 FOR UPDATE SKIP LOCKED),
+                (SELECT name FROM synthesis
+                 WHERE status = 'locked' AND locked_at < NOW() - INTERVAL '5 minutes'
+                 ORDER BY name
+                 LIMIT 1
+                 FOR UPDATE SKIP LOCKED)
+            )
+            RETURNING name
+        """, (worker_id,))
+
+        result = cur.fetchone()
+        return result[0] if result else None
 
 
 def extend_lock(directory: str, worker_id: str) -> bool:
     """Extend lock for another 5 minutes."""
-    conn = get_db_connection()
-    conn.autocommit = True
-    cur = conn.cursor()
-
-    try:
-        cur.execute("""
+    with get_conn() as conn, conn.cursor() as cur:
+        execute_prepared(cur, 'extend_lock', """
             UPDATE synthesis
             SET locked_at = NOW()
-            WHERE name = %s AND locked_by = %s AND status = 'locked'
+            WHERE name = $1 AND locked_by = $2 AND status = 'locked'
             RETURNING name
         """, (directory, worker_id))
         result = cur.fetchone()
         return result is not None
-    finally:
-        cur.close()
-        conn.close()
 
 
-def save_smiles_result(synthesis_id: int, image_filename: str, smiles: str,
-                       smiles_confidence: float, error: str, duration_ms: int, worker_id: str):
-    """Save SMILES result to database."""
-    conn = get_db_connection()
-    conn.autocommit = True
-    cur = conn.cursor()
+def heartbeat(stop_event: threading.Event, directory: str, worker_id: str):
+    """Keep the directory lock fresh until stop_event is set."""
+    while not stop_event.wait(HEARTBEAT_INTERVAL):
+        try:
+            if not extend_lock(directory, worker_id):
+                log_to_db(worker_id, directory, 'WARNING', 'Lock lost during heartbeat')
+        except Exception as e:
+            log_to_db(worker_id, directory, 'WARNING', f'Heartbeat failed: {e}')
 
-    try:
-        cur.execute("""
+
+_predict_SMILES = None
+
+
+def import_decimer():
+    """Import DECIMER's predict_SMILES, one worker per VM at a time.
+
+    The first import downloads the ~500MB model; concurrent first imports
+    corrupt the download, so a Postgres advisory lock keyed on the host
+    serializes them. Later imports find the cached model and return quickly,
+    and within one process the loaded function is reused.
+    """
+    global _predict_SMILES
+    if _predict_SMILES is not None:
+        return _predict_SMILES
+
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(hashtext(%s))", (DECIMER_LOAD_LOCK,))
+        try:
+            from DECIMER import predict_SMILES
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (DECIMER_LOAD_LOCK,))
+    _predict_SMILES = predict_SMILES
+    return predict_SMILES
+
+
+def prefetch_map(executor, fn, items, depth: int):
+    """Like executor.map, but with at most `depth` results in flight or waiting.
+
+    The first `depth` items are submitted right away, before the returned
+    iterator is first advanced, so their work overlaps whatever the caller
+    does in between (e.g. importing the model).
+    """
+    items = iter(items)
+    futures = deque(executor.submit(fn, item) for item in islice(items, depth))
+
+    def results():
+        for item in items:
+            yield futures.popleft().result()
+            futures.append(executor.submit(fn, item))
+        while futures:
+            yield futures.popleft().result()
+
+    return results()
+
+
+def save_smiles_results(rows: list):
+    """Save a batch of SMILES results to database in one round-trip.
+
+    Each row is (synthesis_id, image_filename, smiles, smiles_confidence, error, duration_ms, worker_id).
+
+    New rows take the plain insert path: Postgres only evaluates the DO UPDATE
+    SET list for rows that actually conflict (re-processed directories), so
+    splitting into INSERT ... DO NOTHING plus a follow-up UPDATE would only
+    add a round-trip.
+    """
+    if not rows:
+        return
+
+    with get_conn() as conn, conn.cursor() as cur:
+        execute_values(cur, """
             INSERT INTO smiles_results
                 (synthesis_id, image_filename, smiles, smiles_confidence, error, duration_ms, worker_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            VALUES %s
             ON CONFLICT (synthesis_id, image_filename) DO UPDATE SET
                 smiles = EXCLUDED.smiles,
                 smiles_confidence = EXCLUDED.smiles_confidence,
@@ -90,19 +186,12 @@ def save_smiles_result(synthesis_id: int, image_filename: str, smiles: str,
                 duration_ms = EXCLUDED.duration_ms,
                 worker_id = EXCLUDED.worker_id,
                 processed_at = NOW()
-        """, (synthesis_id, image_filename, smiles, smiles_confidence, error, duration_ms, worker_id))
-    finally:
-        cur.close()
-        conn.close()
+        """, rows, page_size=BATCH_SIZE)
 
 
 def mark_completed(directory: str, worker_id: str, successful: int, failed: int, image_count: int):
     """Mark directory as completed in PostgreSQL."""
-    conn = get_db_connection()
-    conn.autocommit = True
-    cur = conn.cursor()
-
-    try:
+    with get_conn() as conn, conn.cursor() as cur:
         cur.execute("""
             UPDATE synthesis
             SET status = 'completed',
@@ -113,90 +202,92 @@ def mark_completed(directory: str, worker_id: str, successful: int, failed: int,
                 image_count = %s
             WHERE name = %s
         """, (worker_id, successful, failed, image_count, directory))
-    finally:
-        cur.close()
-        conn.close()
 
 
 def mark_failed(directory: str, worker_id: str):
     """Mark directory as failed in PostgreSQL."""
-    conn = get_db_connection()
-    conn.autocommit = True
-    cur = conn.cursor()
-
-    try:
+    with get_conn() as conn, conn.cursor() as cur:
         cur.execute("""
             UPDATE synthesis
             SET status = 'failed',
                 worker_id = %s
             WHERE name = %s
         """, (worker_id, directory))
-    finally:
-        cur.close()
-        conn.close()
-
-
-def main():
-    if len(sys.argv) < 3:
-        print("Usage: python worker.py <directory> <worker_id>")
-        sys.exit(1)
 
-    directory = sys.argv[1]
-    worker_id = sys.argv[2]
 
+def process_directory(container, directory: str, worker_id: str) -> bool:
+    """Process one directory whose lock is held by worker_id. Returns True on success."""
     # Get synthesis_id
     synthesis_id = get_synthesis_id(directory)
     if not synthesis_id:
         log_to_db(worker_id, directory, 'ERROR', f'Synthesis not found: {directory}')
         print(f"[{worker_id}] Synthesis not found: {directory}")
-        sys.exit(1)
+        return False
 
     # Lock already acquired by blob_processor, just extend it
     if not extend_lock(directory, worker_id):
         log_to_db(worker_id, directory, 'ERROR', 'Lock not found or expired')
         print(f"[{worker_id}] Lock not found for {directory}")
-        sys.exit(1)
+        return False
 
     print(f"[{worker_id}] Processing: {directory} (synthesis_id={synthesis_id})")
 
-    # Connect to blob storage
-    blob_service = BlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING)
-    container = blob_service.get_container_client(BLOB_CONTAINER)
+    # Refresh the lock in the background instead of after every image
+    stop_heartbeat = threading.Event()
+    threading.Thread(target=heartbeat, args=(stop_heartbeat, directory, worker_id),
+                     daemon=True).start()
 
     try:
-        # Download images to temp directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir)
-
-            print(f"[{worker_id}] Downloading images...")
-            images = []
-            prefix = f"{directory}/output/"
-            for blob in container.list_blobs(name_starts_with=prefix):
-                if blob.name.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    local_file = temp_path / Path(blob.name).name
-                    with open(local_file, 'wb') as f:
-                        f.write(container.get_blob_client(blob.name).download_blob().readall())
-                    images.append(local_file)
-
-            if not images:
-                print(f"[{worker_id}] No images found")
-                mark_completed(directory, worker_id, 0, 0, 0)
-                return
-
-            print(f"[{worker_id}] Processing {len(images)} images...")
+        prefix = f"{directory}/output/"
+        blob_names = sorted(
+            (blob.name for blob in container.list_blobs(name_starts_with=prefix)
+             if blob.name.lower().endswith(('.png', '.jpg', '.jpeg'))),
+            key=lambda name: Path(name).name
+        )
+
+        if not blob_names:
+            print(f"[{worker_id}] No images found")
+            mark_completed(directory, worker_id, 0, 0, 0)
+            return True
+
+        def fetch(blob_name: str) -> tuple[str, np.ndarray | Exception]:
+            """Download and decode one image; decode errors are returned, not raised."""
+            data = container.get_blob_client(blob_name).download_blob().readall()
+            try:
+                # BytesIO wraps the downloaded bytes without copying them, and the
+                # download threads share memory with the inference loop, so the
+                # only copy after the network read is Pillow's decoded array.
+                # Same RGBA conversion DECIMER applies when given a path.
+                return Path(blob_name).name, np.asarray(Image.open(BytesIO(data)).convert('RGBA'))
+            except Exception as e:
+                return Path(blob_name).name, e
+
+        print(f"[{worker_id}] Processing {len(blob_names)} images...")
+
+        # Download and decode concurrently in the background; images are yielded
+        # in order as soon as each is ready, so all CPU/network work other than
+        # the model call overlaps with inference. Images stay in memory and go
+        # to DECIMER as arrays, never touching disk. DECIMER's saved model only
+        # takes one image per call, so this is as far as batching can go.
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as downloader:
+            images = prefetch_map(downloader, fetch, blob_names, PREFETCH_DEPTH)
 
             # Import DECIMER only when needed
-            from DECIMER import predict_SMILES
+            predict_SMILES = import_decimer()
 
             successful = 0
             failed = 0
+            pending_rows = []
 
-            for i, img in enumerate(sorted(images)):
+            for i, (image_name, image) in enumerate(images):
                 start_time = time.time()
 
                 try:
+                    if isinstance(image, Exception):
+                        raise image
+
                     # Get SMILES with confidence scores
-                    result = predict_SMILES(str(img), confidence=True)
+                    result = predict_SMILES(image, confidence=True)
                     duration_ms = int((time.time() - start_time) * 1000)
 
                     # Parse result: (smiles_string, [(char, confidence), ...])
@@ -205,55 +296,75 @@ def main():
 
                     # Calculate average confidence
                     if char_confidences:
-                        avg_confidence = sum(float(c[1]) for c in char_confidences) / len(char_confidences)
+                        avg_confidence = float(np.fromiter((c[1] for c in char_confidences), dtype=np.float64,
+                                                           count=len(char_confidences)).mean())
                     else:
                         avg_confidence = None
 
-                    # Save to database
-                    save_smiles_result(
-                        synthesis_id=synthesis_id,
-                        image_filename=img.name,
-                        smiles=smiles,
-                        smiles_confidence=avg_confidence,
-                        error=None,
-                        duration_ms=duration_ms,
-                        worker_id=worker_id
-                    )
+                    pending_rows.append((synthesis_id, image_name, smiles, avg_confidence,
+                                         None, duration_ms, worker_id))
                     successful += 1
 
                 except Exception as e:
                     duration_ms = int((time.time() - start_time) * 1000)
-
-                    # Save error to database
-                    save_smiles_result(
-                        synthesis_id=synthesis_id,
-                        image_filename=img.name,
-                        smiles=None,
-                        smiles_confidence=None,
-                        error=str(e),
-                        duration_ms=duration_ms,
-                        worker_id=worker_id
-                    )
+                    pending_rows.append((synthesis_id, image_name, None, None,
+                                         str(e), duration_ms, worker_id))
                     failed += 1
 
-                # Extend lock after every image
-                extend_lock(directory, worker_id)
+                # Flush accumulated results in batches
+                if len(pending_rows) >= BATCH_SIZE:
+                    save_smiles_results(pending_rows)
+                    pending_rows.clear()
 
                 # Progress every 10 images
                 if (i + 1) % 10 == 0:
-                    print(f"[{worker_id}] Progress: {i+1}/{len(images)}")
+                    print(f"[{worker_id}] Progress: {i+1}/{len(blob_names)}")
 
-            # Mark completed in database
-            mark_completed(directory, worker_id, successful, failed, len(images))
-            print(f"[{worker_id}] Done: {successful}/{len(images)} successful")
+        # Flush remaining results before marking completed
+        save_smiles_results(pending_rows)
+        pending_rows.clear()
+
+        # Mark completed in database
+        mark_completed(directory, worker_id, successful, failed, len(blob_names))
+        log_to_db(worker_id, directory, 'INFO', f'Completed: {successful}/{len(blob_names)} successful')
+        print(f"[{worker_id}] Done: {successful}/{len(blob_names)} successful")
+        return True
 
     except Exception as e:
         tb = traceback.format_exc()
         log_to_db(worker_id, directory, 'ERROR', str(e), tb)
         print(f"[{worker_id}] Error: {e}")
         mark_failed(directory, worker_id)
+        return False
+    finally:
+        stop_heartbeat.set()
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python worker.py <worker_id>")
+        print("       python worker.py <directory> <worker_id>")
         sys.exit(1)
 
+    # Connect to blob storage
+    blob_service = BlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING)
+    container = blob_service.get_container_client(BLOB_CONTAINER)
+
+    if len(sys.argv) == 3:
+        directory, worker_id = sys.argv[1], sys.argv[2]
+        sys.exit(0 if process_directory(container, directory, worker_id) else 1)
+
+    # Keep taking work until nothing is lockable. Exiting (rather than idling)
+    # frees the model's memory; blob_processor respawns a worker when
+    # expired locks make directories available again.
+    worker_id = sys.argv[1]
+    while True:
+        directory = find_and_lock_available(worker_id)
+        if directory is None:
+            print(f"[{worker_id}] No directories available, exiting")
+            break
+        process_directory(container, directory, worker_id)
+
 
 if __name__ == '__main__':
     main()
@@ -8,7 +8,6 @@ Usage:
 """
 
 import argparse
-import json
 import multiprocessing as mp
 import os
 import sys
@@ -20,6 +19,8 @@ from typing import Optional
 # Must be set before importing TensorFlow
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"  # Suppress TF warnings
 
+from process_synthesis import write_json
+
 
 def setup_environment():
     """Configure environment for DECIMER (works on both Linux and Windows)."""
@@ -95,9 +96,8 @@ def process_single_synthesis(args: tuple) -> dict:
             result["error"] = "No output directory"
             return result
 
-        # Count images
-        image_files = list(output_dir.glob("*.png"))
-        if not image_files:
+        # Need at least one image
+        if not has_png(output_dir):
             result["status"] = "skipped"
             result["error"] = "No PNG files"
             return result
@@ -112,8 +112,7 @@ def process_single_synthesis(args: tuple) -> dict:
         elapsed = time.time() - start_time
 
         # Save JSON output
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(synthesis_result, f, indent=2, ensure_ascii=False)
+        write_json(output_file, synthesis_result)
 
         result["status"] = "completed"
         result["images_processed"] = synthesis_result.get("successful", 0)
@@ -127,31 +126,43 @@ def process_single_synthesis(args: tuple) -> dict:
     return result
 
 
-def get_pending_syntheses(root_dir: Path) -> list:
-    """Get list of synthesis directories that haven't been processed yet."""
-    pending = []
+def has_png(output_dir: str) -> bool:
+    """Check whether a directory contains at least one PNG, stopping at the first."""
+    try:
+        with os.scandir(output_dir) as entries:
+            return any(e.name.endswith(".png") for e in entries)
+    except (FileNotFoundError, NotADirectoryError):
+        return False
 
-    for item in sorted(root_dir.iterdir()):
-        if not item.is_dir():
-            continue
 
-        output_dir = item / "output"
-        output_file = item / "smiles_output.json"
+def scan_syntheses(root_dir: Path) -> tuple[list, list, list, list]:
+    """
+    Classify synthesis directories in a single pass.
 
-        # Skip if already processed
-        if output_file.exists():
-            continue
+    Returns:
+        Tuple of (all_dirs, with_output, already_done, pending), each a sorted
+        list of Paths. with_output holds directories whose output/ has PNGs;
+        already_done and pending split those by presence of smiles_output.json.
+    """
+    all_dirs, with_output, already_done, pending = [], [], [], []
 
-        # Skip if no output directory with images
-        if not output_dir.exists():
-            continue
+    with os.scandir(root_dir) as entries:
+        dirs = sorted((e for e in entries if e.is_dir()), key=lambda e: e.name)
+
+    for entry in dirs:
+        synthesis_dir = Path(entry.path)
+        all_dirs.append(synthesis_dir)
 
-        if not list(output_dir.glob("*.png")):
+        if not has_png(os.path.join(entry.path, "output")):
             continue
+        with_output.append(synthesis_dir)
 
-        pending.append(item)
+        if os.path.exists(os.path.join(entry.path, "smiles_output.json")):
+            already_done.append(synthesis_dir)
+        else:
+            pending.append(synthesis_dir)
 
-    return pending
+    return all_dirs, with_output, already_done, pending
 
 
 def format_time(seconds: float) -> str:
@@ -201,11 +212,7 @@ def main():
     # Get list of syntheses to process
     print(f"Scanning {root_dir}...")
 
-    # Count directories properly
-    all_dirs = [d for d in sorted(root_dir.iterdir()) if d.is_dir()]
-    with_output = [d for d in all_dirs if (d / "output").exists() and list((d / "output").glob("*.png"))]
-    already_done = [d for d in with_output if (d / "smiles_output.json").exists()]
-    pending = [d for d in with_output if not (d / "smiles_output.json").exists()]
+    all_dirs, with_output, already_done, pending = scan_syntheses(root_dir)
 
     if args.limit:
         pending = pending[:args.limit]
@@ -306,8 +313,7 @@ def main():
         "total_time_seconds": round(total_time, 1),
         "avg_time_per_image": round(total_time / max(total_images, 1), 2)
     }
-    with open(summary_file, "w") as f:
-        json.dump(summary, f, indent=2)
+    write_json(summary_file, summary)
     print(f"\nSummary saved to: {summary_file}")
 
 
@@ -3,56 +3,77 @@
 Process failed syntheses locally, storing results in PostgreSQL.
 
 Checks database for existing results, only processes what's missing.
+On machines with several GPUs, syntheses are split across one process per GPU.
 
 Usage:
     python process_failed_local.py                    # Process all failed
     python process_failed_local.py --limit 5         # Process only first 5
-    python process_failed_local.py --threads 2       # Use 2 threads (default)
+    python process_failed_local.py --threads 2       # Work on 2 syntheses at once (default)
     python process_failed_local.py --dry-run         # List what would be processed
 """
 
 import argparse
+import csv
+import hashlib
+import io
 import os
+import subprocess
 import sys
 import time
+from contextlib import contextmanager
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from threading import Lock
-from datetime import datetime
 
+import numpy as np
 import psycopg2
-from psycopg2 import pool
+from psycopg2 import errors, pool
+from psycopg2.extras import execute_batch, execute_values
 
 # Add azure dir to path for db_config
 SCRIPT_DIR = Path(__file__).parent
 sys.path.insert(0, str(SCRIPT_DIR / "azure"))
-from db_config import DB_CONFIG
+from db_config import DB_CONFIG, PreparingConnection, prepare_once
+from run_decimer import load_model, predict_images
 
 # Paths
 IMAGES_BASE = Path("/mnt/d/chemistry-scraped")
 
-# Thread-safe print lock
-print_lock = Lock()
+# Number of SMILES results to accumulate before flushing to the database
+BATCH_SIZE = 500
+# Images between per-synthesis progress lines
+PROGRESS_EVERY = 20
+# NULL marker for COPY rows, so empty strings are not read as NULL
+COPY_NULL = r"\N"
 
 # Connection pool (initialized in main)
 connection_pool = None
 
 
 def log(msg: str, level: str = "INFO"):
-    """Thread-safe logging with timestamp."""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    with print_lock:
-        print(f"[{timestamp}] [{level}] {msg}", flush=True)
+    """Thread-safe logging with timestamp.
+
+    Each line goes out in a single write, which CPython does not interleave
+    with other threads' writes, so no lock is needed.
+    """
+    sys.stdout.write(f"[{time.strftime('%H:%M:%S')}] [{level}] {msg}\n")
+    sys.stdout.flush()
 
 
 def init_connection_pool(min_conn: int = 2, max_conn: int = 4):
-    """Initialize the connection pool."""
+    """Initialize the connection pool.
+
+    Sessions run with synchronous_commit off: a commit returns before its WAL
+    is flushed to disk. A server crash can lose the last few commits, which
+    only means those images are picked up again on the next run.
+    """
     global connection_pool
     connection_pool = pool.ThreadedConnectionPool(
         minconn=min_conn,
         maxconn=max_conn,
+        connection_factory=PreparingConnection,
         **DB_CONFIG,
-        connect_timeout=10
+        connect_timeout=10,
+        options="-c synchronous_commit=off"
     )
     log(f"Connection pool initialized ({min_conn}-{max_conn} connections)")
 
@@ -72,58 +93,110 @@ def release_db_connection(conn):
         connection_pool.putconn(conn)
 
 
-def get_synthesis_id(synthesis_name: str) -> int:
-    """Get synthesis ID from name."""
+@contextmanager
+def db_connection(conn=None):
+    """Yield conn if one is passed in, otherwise a pooled connection that is returned afterwards."""
+    if conn is not None:
+        yield conn
+        return
     conn = get_db_connection()
-    cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM synthesis WHERE name = %s", (synthesis_name,))
-        result = cur.fetchone()
-        return result[0] if result else None
+        yield conn
     finally:
-        cur.close()
         release_db_connection(conn)
 
 
-def get_existing_results_count(synthesis_id: int) -> int:
-    """Check how many results exist for a synthesis."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "SELECT COUNT(*) FROM smiles_results WHERE synthesis_id = %s",
-            (synthesis_id,)
-        )
-        return cur.fetchone()[0]
-    finally:
-        cur.close()
-        release_db_connection(conn)
+def list_png_entries(directory: Path) -> list:
+    """List PNG files in a directory as os.DirEntry objects, sorted by name.
 
+    os.scandir returns names in batches without a stat() per file, which is
+    much cheaper than Path.glob on the WSL-mounted image drive.
+    """
+    with os.scandir(directory) as it:
+        entries = [e for e in it if e.name.endswith('.png')]
+    entries.sort(key=lambda e: e.name)
+    return entries
 
-def get_failed_syntheses(limit: int = None) -> list:
-    """Get list of failed syntheses from database."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        query = "SELECT name FROM synthesis WHERE status = 'failed' ORDER BY name"
-        if limit:
-            query += f" LIMIT {limit}"
-        cur.execute(query)
-        return [row[0] for row in cur.fetchall()]
-    finally:
-        cur.close()
-        release_db_connection(conn)
 
+def get_synthesis_state(synthesis_name: str, conn=None) -> tuple:
+    """Get (synthesis_id, set of image filenames with results) in one query.
+
+    Returns (None, set()) if the synthesis is not in the database.
+    """
+    with db_connection(conn) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT s.id, array_remove(array_agg(r.image_filename), NULL)
+                FROM synthesis s
+                LEFT JOIN smiles_results r ON r.synthesis_id = s.id
+                WHERE s.name = %s
+                GROUP BY s.id
+            """, (synthesis_name,))
+            row = cur.fetchone()
+            return (row[0], set(row[1])) if row else (None, set())
+        finally:
+            cur.close()
+
+
+def get_failed_syntheses(limit: int = None, conn=None) -> list:
+    """Get list of failed syntheses from database."""
+    with db_connection(conn) as conn:
+        cur = conn.cursor()
+        try:
+            query = "SELECT name FROM synthesis WHERE status = 'failed' ORDER BY name"
+            if limit:
+                query += f" LIMIT {limit}"
+            cur.execute(query)
+            return [row[0] for row in cur.fetchall()]
+        finally:
+            cur.close()
+
+
+def copy_smiles_results(cur, rows: list):
+    """Append SMILES results with COPY FROM STDIN (no conflict handling)."""
+    buf = io.StringIO()
+    # None is written as the COPY_NULL marker; empty strings stay empty strings,
+    # as with the upsert (an empty unquoted CSV field would otherwise mean NULL)
+    csv.writer(buf).writerows(
+        [COPY_NULL if value is None else value for value in row] for row in rows
+    )
+    buf.seek(0)
+    cur.copy_expert(f"""
+        COPY smiles_results
+            (synthesis_id, image_filename, smiles, smiles_confidence, error, duration_ms, worker_id)
+        FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')
+    """, buf)
+
+
+def save_smiles_results(conn, rows: list, commit: bool = True, fresh: bool = False):
+    """Save a batch of SMILES results and commit, using existing connection.
+
+    Each row is (synthesis_id, image_filename, smiles, smiles_confidence, error, duration_ms, worker_id).
+    The upsert is prepared once per connection; each batch is sent as one
+    round trip of EXECUTE calls, so the server skips parsing and planning per row.
+    fresh means none of the rows were stored when the run started; they are then
+    streamed with COPY, falling back to the upsert if a row turns out to exist.
+    The fallback rolls back, so no uncommitted writes may precede the call.
+    """
+    if not rows:
+        return
 
-def save_smiles_result(conn, synthesis_id: int, image_filename: str, smiles: str,
-                       smiles_confidence: float, error: str, duration_ms: int, worker_id: str):
-    """Save SMILES result to database using existing connection."""
     cur = conn.cursor()
     try:
-        cur.execute("""
+        if fresh:
+            try:
+                copy_smiles_results(cur, rows)
+                if commit:
+                    conn.commit()
+                return
+            except errors.UniqueViolation:
+                conn.rollback()
+
+        prepare_once(cur, "smiles_upsert(int, text, text, float8, text, int, text)", """
             INSERT INTO smiles_results
                 (synthesis_id, image_filename, smiles, smiles_confidence, error, duration_ms, worker_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            VALUES ($1, $2, $3, $4, $5, $6, $7)
             ON CONFLICT (synthesis_id, image_filename) DO UPDATE SET
                 smiles = EXCLUDED.smiles,
                 smiles_confidence = EXCLUDED.smiles_confidence,
@@ -131,31 +204,106 @@ def save_smiles_result(conn, synthesis_id: int, image_filename: str, smiles: str
                 duration_ms = EXCLUDED.duration_ms,
                 worker_id = EXCLUDED.worker_id,
                 processed_at = NOW()
-        """, (synthesis_id, image_filename, smiles, smiles_confidence, error, duration_ms, worker_id))
-        conn.commit()
+        """)
+        execute_batch(cur, "EXECUTE smiles_upsert (%s, %s, %s, %s, %s, %s, %s)", rows, page_size=BATCH_SIZE)
+        if commit:
+            conn.commit()
     finally:
         cur.close()
 
 
-def mark_synthesis_completed(synthesis_name: str, worker_id: str, successful: int, failed: int, image_count: int):
-    """Mark synthesis as completed in database."""
-    conn = get_db_connection()
+def image_hash(path) -> str:
+    """SHA-256 of an image file's bytes, the key into smiles_hash_cache."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def ensure_hash_cache_table(conn=None):
+    """Create smiles_hash_cache if it does not exist yet (same DDL as azure/DEPLOYMENT_NOTES.md)."""
+    with db_connection(conn) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS smiles_hash_cache (
+                    hash TEXT PRIMARY KEY,
+                    smiles TEXT,
+                    smiles_confidence FLOAT
+                )
+            """)
+            conn.commit()
+        finally:
+            cur.close()
+
+
+def get_cached_predictions(hashes, conn=None) -> dict:
+    """Get {hash: (smiles, smiles_confidence)} for images DECIMER has already predicted."""
+    with db_connection(conn) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "SELECT hash, smiles, smiles_confidence FROM smiles_hash_cache WHERE hash = ANY(%s)",
+                (list(hashes),)
+            )
+            return {h: (smiles, confidence) for h, smiles, confidence in cur.fetchall()}
+        finally:
+            cur.close()
+
+
+def save_cached_predictions(conn, rows: list):
+    """Remember successful predictions as (hash, smiles, smiles_confidence) rows, without committing."""
+    if not rows:
+        return
+
     cur = conn.cursor()
     try:
-        cur.execute("""
-            UPDATE synthesis
-            SET status = 'completed',
-                completed_at = NOW(),
-                worker_id = %s,
-                successful = %s,
-                failed = %s,
-                image_count = %s
-            WHERE name = %s
-        """, (worker_id, successful, failed, image_count, synthesis_name))
-        conn.commit()
+        execute_values(cur, """
+            INSERT INTO smiles_hash_cache (hash, smiles, smiles_confidence)
+            VALUES %s
+            ON CONFLICT (hash) DO NOTHING
+        """, rows, page_size=BATCH_SIZE)
     finally:
         cur.close()
-        release_db_connection(conn)
+
+
+def get_results_counts(synthesis_names: list, conn=None) -> dict:
+    """Get {name: (synthesis_id, result_count)} for many syntheses in one query.
+
+    Names missing from the synthesis table map to (None, 0).
+    """
+    with db_connection(conn) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT n.name, s.id, COUNT(r.id)
+                FROM unnest(%s::text[]) AS n(name)
+                LEFT JOIN synthesis s ON s.name = n.name
+                LEFT JOIN smiles_results r ON r.synthesis_id = s.id
+                GROUP BY n.name, s.id
+            """, (list(synthesis_names),))
+            return {name: (synthesis_id, count) for name, synthesis_id, count in cur.fetchall()}
+        finally:
+            cur.close()
+
+
+def mark_synthesis_completed(synthesis_name: str, worker_id: str, successful: int, failed: int, image_count: int,
+                             conn=None):
+    """Mark synthesis as completed in database."""
+    with db_connection(conn) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                UPDATE synthesis
+                SET status = 'completed',
+                    completed_at = NOW(),
+                    worker_id = %s,
+                    successful = %s,
+                    failed = %s,
+                    image_count = %s
+                WHERE name = %s
+            """, (worker_id, successful, failed, image_count, synthesis_name))
+            conn.commit()
+        finally:
+            cur.close()
 
 
 def process_single_synthesis(synthesis_name: str, worker_id: str) -> dict:
@@ -177,20 +325,10 @@ def process_single_synthesis(synthesis_name: str, worker_id: str) -> dict:
 
     start_time = time.time()
     conn = None
+    pending = []  # result rows not yet flushed to the database
 
     try:
-        # Get DB connection for this synthesis (reused for all images)
-        conn = get_db_connection()
-
-        # Get synthesis ID from database
-        synthesis_id = get_synthesis_id(synthesis_name)
-        if not synthesis_id:
-            result["status"] = "error"
-            result["error"] = "Synthesis not found in database"
-            log(f"[{worker_id}] SKIP {synthesis_name}: not in database", "ERROR")
-            return result
-
-        # Check local directory
+        # Local checks first: they need no database round trip
         synthesis_dir = IMAGES_BASE / synthesis_name
         if not synthesis_dir.exists():
             result["status"] = "error"
@@ -206,7 +344,7 @@ def process_single_synthesis(synthesis_name: str, worker_id: str) -> dict:
             return result
 
         # Count local images
-        image_files = sorted(output_dir.glob("*.png"))
+        image_files = list_png_entries(output_dir)
         result["total"] = len(image_files)
 
         if not image_files:
@@ -215,72 +353,102 @@ def process_single_synthesis(synthesis_name: str, worker_id: str) -> dict:
             log(f"[{worker_id}] SKIP {synthesis_name}: no images", "ERROR")
             return result
 
-        # Check if already has results in database
-        existing_count = get_existing_results_count(synthesis_id)
-        if existing_count >= len(image_files):
+        # Get DB connection for this synthesis (reused for all images)
+        conn = get_db_connection()
+
+        # Synthesis ID and already-processed filenames in one query
+        synthesis_id, existing = get_synthesis_state(synthesis_name, conn)
+        if not synthesis_id:
+            result["status"] = "error"
+            result["error"] = "Synthesis not found in database"
+            log(f"[{worker_id}] SKIP {synthesis_name}: not in database", "ERROR")
+            return result
+
+        # Only images without a stored result still need processing
+        todo = [e for e in image_files if e.name not in existing]
+        existing_count = len(image_files) - len(todo)
+        if not todo:
             # Mark as completed since all images have results
-            mark_synthesis_completed(synthesis_name, worker_id, existing_count, 0, len(image_files))
+            mark_synthesis_completed(synthesis_name, worker_id, existing_count, 0, len(image_files), conn)
             result["status"] = "skipped"
             result["skipped"] = True
             result["successful"] = existing_count
             log(f"[{worker_id}] SKIP {synthesis_name}: already has {existing_count} results in DB (marked completed)")
             return result
 
-        log(f"[{worker_id}] START {synthesis_name} ({len(image_files)} images, {existing_count} existing)")
-
-        # Import DECIMER (heavy, only when needed)
-        from DECIMER import predict_SMILES
+        log(f"[{worker_id}] START {synthesis_name} ({len(todo)} of {len(image_files)} images, {existing_count} existing)")
 
         successful = 0
         failed = 0
-
-        for i, img_path in enumerate(image_files):
+        new_cache_rows = []  # (hash, smiles, confidence) from this run, saved with each flush
+
+        # Byte-identical images reuse an earlier prediction; DECIMER runs once per new hash
+        hashes = {e.name: image_hash(e.path) for e in todo}
+        cached = get_cached_predictions(set(hashes.values()), conn)
+        uncached = {}  # hash -> entries sharing that image
+        for entry in todo:
+            h = hashes[entry.name]
+            if h in cached:
+                smiles, avg_confidence = cached[h]
+                pending.append((synthesis_id, entry.name, smiles, avg_confidence, None, 0, worker_id))
+                successful += 1
+            else:
+                uncached.setdefault(h, []).append(entry)
+        to_predict = [entries[0] for entries in uncached.values()]
+        if cached:
+            log(f"[{worker_id}] {synthesis_name}: {successful} images from cache, {len(to_predict)} to predict")
+
+        # DECIMER is imported on first use; images are preprocessed a batch ahead of the model
+        img_start = time.time()
+        next_log = PROGRESS_EVERY
+        predictions = predict_images(to_predict, confidence=True)
+        for i, (img_path, smiles, char_confidences, error) in enumerate(predictions):
+            duration_ms = int((time.time() - img_start) * 1000)
             img_start = time.time()
+            h = hashes[img_path.name]
 
-            try:
-                # Get SMILES with confidence
-                smiles, char_confidences = predict_SMILES(str(img_path), confidence=True)
-                duration_ms = int((time.time() - img_start) * 1000)
-
+            if error is None:
                 # Calculate average confidence
                 if char_confidences:
-                    avg_confidence = sum(float(c[1]) for c in char_confidences) / len(char_confidences)
+                    avg_confidence = float(np.fromiter((c[1] for c in char_confidences), dtype=np.float64,
+                                                       count=len(char_confidences)).mean())
                 else:
                     avg_confidence = None
-
-                # Save to database (reusing connection)
-                save_smiles_result(
-                    conn,
-                    synthesis_id=synthesis_id,
-                    image_filename=img_path.name,
-                    smiles=smiles,
-                    smiles_confidence=avg_confidence,
-                    error=None,
-                    duration_ms=duration_ms,
-                    worker_id=worker_id
-                )
-                successful += 1
-
-            except Exception as e:
-                duration_ms = int((time.time() - img_start) * 1000)
-                save_smiles_result(
-                    conn,
-                    synthesis_id=synthesis_id,
-                    image_filename=img_path.name,
-                    smiles=None,
-                    smiles_confidence=None,
-                    error=str(e),
-                    duration_ms=duration_ms,
-                    worker_id=worker_id
-                )
-                failed += 1
-
-            # Progress every 20 images
-            if (i + 1) % 20 == 0:
-                log(f"[{worker_id}] {synthesis_name}: {i+1}/{len(image_files)}")
-
-        # Mark synthesis as completed
-        mark_synthesis_completed(synthesis_name, worker_id, successful, failed, len(image_files))
+                new_cache_rows.append((h, smiles, avg_confidence))
+
+            # Duplicates of this image share its result; only the one that ran gets the duration
+            for entry in uncached[h]:
+                if error is None:
+                    pending.append((synthesis_id, entry.name, smiles, avg_confidence,
+                                    None, duration_ms, worker_id))
+                    successful += 1
+                else:
+                    pending.append((synthesis_id, entry.name, None, None,
+                                    error, duration_ms, worker_id))
+                    failed += 1
+                duration_ms = 0
+
+            # Flush accumulated results in batches (reusing connection)
+            if len(pending) >= BATCH_SIZE:
+                save_smiles_results(conn, pending, commit=False, fresh=True)
+                save_cached_predictions(conn, new_cache_rows)
+                conn.commit()
+                pending.clear()
+                new_cache_rows.clear()
+
+            # Progress every PROGRESS_EVERY images
+            if i + 1 == next_log:
+                next_log += PROGRESS_EVERY
+                log(f"[{worker_id}] {synthesis_name}: {i+1}/{len(to_predict)}")
+
+        # Images that already had results count as successful, as in the skip path
+        successful += existing_count
+
+        # Flush remaining results and mark synthesis as completed under a single commit
+        save_smiles_results(conn, pending, commit=False, fresh=True)
+        save_cached_predictions(conn, new_cache_rows)
+        mark_synthesis_completed(synthesis_name, worker_id, successful, failed, len(image_files), conn)
+        pending.clear()
 
         result["status"] = "completed"
         result["successful"] = successful
@@ -297,11 +465,60 @@ def process_single_synthesis(synthesis_name: str, worker_id: str) -> dict:
 
     finally:
         if conn:
+            # Keep partial progress if the synthesis failed mid-way
+            if pending:
+                try:
+                    conn.rollback()  # discard a half-finished final transaction
+                    save_smiles_results(conn, pending)
+                except Exception as e:
+                    conn.rollback()
+                    log(f"[{worker_id}] Could not save {len(pending)} pending results for {synthesis_name}: {e}", "ERROR")
             release_db_connection(conn)
 
     return result
 
 
+def count_gpus() -> int:
+    """Count NVIDIA GPUs via nvidia-smi, without initializing CUDA in this process."""
+    try:
+        out = subprocess.run(["nvidia-smi", "-L"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return 0
+    return sum(1 for line in out.splitlines() if line.startswith("GPU "))
+
+
+def run_per_gpu(syntheses: list, gpu_count: int, threads: int) -> int:
+    """Split syntheses round-robin over one child process per GPU and wait for them.
+
+    Each child gets its GPU through CUDA_VISIBLE_DEVICES, which it applies by
+    initializing TensorFlow's devices before importing DECIMER (see main),
+    and reads its synthesis names from stdin. Children are plain subprocesses rather than a
+    ProcessPoolExecutor, which crashed TensorFlow workers (see azure/LESSONS_LEARNED.md).
+    Returns the number of children that exited with an error.
+    """
+    procs = []
+    for gpu in range(gpu_count):
+        names = syntheses[gpu::gpu_count]
+        if not names:
+            continue
+        env = dict(os.environ, CUDA_VISIBLE_DEVICES=str(gpu))
+        proc = subprocess.Popen(
+            [sys.executable, "-u", str(Path(__file__).resolve()), "--threads", str(threads), "--gpu-worker", str(gpu)],
+            stdin=subprocess.PIPE, env=env, text=True
+        )
+        proc.stdin.write("\n".join(names))
+        proc.stdin.close()
+        procs.append((gpu, proc))
+        log(f"Started GPU {gpu} worker (pid {proc.pid}) with {len(names)} syntheses")
+
+    failures = 0
+    for gpu, proc in procs:
+        if proc.wait() != 0:
+            log(f"GPU {gpu} worker exited with code {proc.returncode}", "ERROR")
+            failures += 1
+    return failures
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Process failed syntheses locally, save to PostgreSQL"
@@ -310,7 +527,7 @@ def main():
         "--threads", "-t",
         type=int,
         default=2,
-        help="Number of parallel threads (default: 2)"
+        help="Number of syntheses handled in parallel; model calls share one inference thread (default: 2)"
     )
     parser.add_argument(
         "--limit", "-l",
@@ -323,19 +540,28 @@ def main():
         action="store_true",
         help="List syntheses without processing"
     )
+    parser.add_argument(
+        "--gpu-worker",
+        type=int,
+        default=None,
+        help=argparse.SUPPRESS  # internal: child started by run_per_gpu, names on stdin
+    )
 
     args = parser.parse_args()
 
-    # Initialize connection pool
+    # Initialize connection pool (each thread holds one connection per synthesis)
     try:
-        init_connection_pool(min_conn=10, max_conn=30)
+        init_connection_pool(min_conn=args.threads, max_conn=args.threads * 2)
     except Exception as e:
         log(f"Database connection failed: {e}", "ERROR")
         sys.exit(1)
 
-    # Get failed syntheses from database
+    # Get failed syntheses from database (GPU workers get their share from the parent)
     try:
-        syntheses = get_failed_syntheses(args.limit)
+        if args.gpu_worker is not None:
+            syntheses = [line.strip() for line in sys.stdin if line.strip()]
+        else:
+            syntheses = get_failed_syntheses(args.limit)
     except Exception as e:
         log(f"Failed to query database: {e}", "ERROR")
         sys.exit(1)
@@ -350,8 +576,11 @@ def main():
         needs_processing = 0
         already_done = 0
 
+        # IDs and result counts for every name in one round trip
+        counts = get_results_counts(syntheses)
+
         for name in syntheses:
-            synthesis_id = get_synthesis_id(name)
+            synthesis_id, db_results = counts[name]
             if not synthesis_id:
                 print(f"  [NOT IN DB] {name}")
                 continue
@@ -361,8 +590,7 @@ def main():
                 print(f"  [NO LOCAL]  {name}")
                 continue
 
-            local_images = len(list(local_dir.glob("*.png")))
-            db_results = get_existing_results_count(synthesis_id)
+            local_images = len(list_png_entries(local_dir))
 
             if db_results >= local_images:
                 print(f"  [DONE {db_results:3d}/{local_images:3d}] {name}")
@@ -376,10 +604,33 @@ def main():
         print(f"Needs processing: {needs_processing}")
         return
 
+    # The prediction cache table predates some databases; create it once here,
+    # before any GPU workers start, so processing never hits a missing table
+    try:
+        ensure_hash_cache_table()
+    except Exception as e:
+        log(f"Failed to create smiles_hash_cache: {e}", "ERROR")
+        sys.exit(1)
+
+    # With several GPUs, run one process per GPU instead of sharing one model
+    if args.gpu_worker is None:
+        gpu_count = count_gpus()
+        if gpu_count > 1:
+            log(f"Found {gpu_count} GPUs, splitting {len(syntheses)} syntheses across them")
+            if run_per_gpu(syntheses, gpu_count, args.threads):
+                sys.exit(1)
+            return
+
     # Pre-load DECIMER model
     log("Pre-loading DECIMER model...")
     try:
-        from DECIMER import predict_SMILES
+        if args.gpu_worker is not None:
+            # Importing DECIMER sets CUDA_VISIBLE_DEVICES="0". Initialize the
+            # devices first, while this child's GPU is still the visible one;
+            # CUDA reads the variable only once, at initialization
+            import tensorflow as tf
+            tf.config.list_physical_devices("GPU")
+        load_model()
         log("DECIMER model loaded")
     except Exception as e:
         log(f"Failed to load DECIMER: {e}", "ERROR")
@@ -397,9 +648,11 @@ def main():
     skipped = 0
     errors = 0
 
+    worker_prefix = "local" if args.gpu_worker is None else f"local-gpu{args.gpu_worker}"
+
     with ThreadPoolExecutor(max_workers=args.threads) as executor:
         future_to_name = {
-            executor.submit(process_single_synthesis, name, f"local-{i % args.threads}"): name
+            executor.submit(process_single_synthesis, name, f"{worker_prefix}-{i % args.threads}"): name
             for i, name in enumerate(syntheses)
         }
 
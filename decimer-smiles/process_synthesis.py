@@ -8,28 +8,32 @@ import argparse
 import json
 import os
 import re
-import site
 import sys
 import time
 from pathlib import Path
 from typing import Optional
 
+import numpy as np
 
-def setup_gpu_environment():
-    """Configure library paths for GPU support (pip-installed CUDA)."""
-    sp = site.getsitepackages()[0]
-    nvidia_dir = f"{sp}/nvidia"
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-    if os.path.exists(nvidia_dir):
-        lib_dirs = ["cudnn", "cublas", "cuda_runtime", "cuda_nvrtc", "cufft",
-                    "cusolver", "cusparse", "nccl", "nvjitlink"]
-        lib_paths = [f"{nvidia_dir}/{d}/lib" for d in lib_dirs]
-        existing_paths = [p for p in lib_paths if os.path.exists(p)]
-        if existing_paths:
-            os.environ["LD_LIBRARY_PATH"] = ":".join(existing_paths) + ":" + os.environ.get("LD_LIBRARY_PATH", "")
-            os.environ["XLA_FLAGS"] = f"--xla_gpu_cuda_data_dir={nvidia_dir}/cuda_nvcc"
-            return True
-    return False
+from run_decimer import setup_gpu_environment
+
+
+def write_json(path: Path, data) -> None:
+    """Write data as indented UTF-8 JSON, using orjson's fast encoder when available."""
+    if orjson is not None:
+        path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+# sequence_XX_part or sequence_XX_sub_YY_part, in one pass
+FILENAME_RE = re.compile(r'sequence_(\d+)(?:_sub_(\d+))?_(left|middle|right)')
 
 
 def parse_filename(filename: str) -> dict:
@@ -40,27 +44,15 @@ def parse_filename(filename: str) -> dict:
         sequence_01_left.png -> {sequence: "01", sub: None, part: "left"}
         sequence_10_sub_01_right.png -> {sequence: "10", sub: "01", part: "right"}
     """
-    stem = Path(filename).stem
-
-    # Pattern for sub-sequences: sequence_XX_sub_YY_part
-    sub_match = re.match(r'sequence_(\d+)_sub_(\d+)_(left|middle|right)', stem)
-    if sub_match:
-        return {
-            "sequence": sub_match.group(1),
-            "sub": sub_match.group(2),
-            "part": sub_match.group(3)
-        }
-
-    # Pattern for regular sequences: sequence_XX_part
-    match = re.match(r'sequence_(\d+)_(left|middle|right)', stem)
-    if match:
-        return {
-            "sequence": match.group(1),
-            "sub": None,
-            "part": match.group(2)
-        }
-
-    return None
+    match = FILENAME_RE.match(Path(filename).stem)
+    if match is None:
+        return None
+
+    return {
+        "sequence": match.group(1),
+        "sub": match.group(2),
+        "part": match.group(3)
+    }
 
 
 def predict_with_confidence(image_path: str, hand_drawn: bool = False) -> dict:
@@ -74,21 +66,24 @@ def predict_with_confidence(image_path: str, hand_drawn: bool = False) -> dict:
             hand_drawn=hand_drawn
         )
 
-        # Calculate average confidence (convert numpy float32 to Python float)
+        # Average, min and rounded per-token values from one array (as Python floats)
         if confidence_data:
-            confidences = [float(c) for _, c in confidence_data]
-            avg_confidence = sum(confidences) / len(confidences)
-            min_confidence = min(confidences)
+            confidences = np.fromiter((c for _, c in confidence_data), dtype=np.float64,
+                                      count=len(confidence_data))
+            avg_confidence = round(float(confidences.mean()), 4)
+            min_confidence = round(float(confidences.min()), 4)
+            per_token = list(zip((tok for tok, _ in confidence_data), np.round(confidences, 4).tolist()))
         else:
             avg_confidence = None
             min_confidence = None
+            per_token = None
 
         return {
             "smiles": smiles,
             "confidence": {
-                "average": round(avg_confidence, 4) if avg_confidence is not None else None,
-                "min": round(min_confidence, 4) if min_confidence is not None else None,
-                "per_token": [(tok, round(float(conf), 4)) for tok, conf in confidence_data] if confidence_data else None
+                "average": avg_confidence,
+                "min": min_confidence,
+                "per_token": per_token
             },
             "error": None
         }
@@ -236,8 +231,7 @@ def main():
         output_path = synthesis_dir / "smiles_output.json"
 
     # Save JSON
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    write_json(output_path, results)
 
     print(f"\nCompleted in {elapsed:.1f}s")
     print(f"Processed: {results['successful']}/{results['total_images']} successful")
@@ -8,9 +8,24 @@ import argparse
 import os
 import site
 import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# Images preprocessed together, ahead of the model
+PREDICT_BATCH_SIZE = 32
+# Batches being preprocessed, and batches queued for the model, ahead of the caller
+PREFETCH_BATCHES = 2
+# Threads running DECIMER's image preprocessing
+PREPROCESS_WORKERS = 4
+
+# Loaded DECIMER module and the single thread that runs every model call
+_decimer = None
+_inference_executor = None
+_model_lock = threading.Lock()
+
 
 def setup_gpu_environment():
     """Configure library paths for GPU support (pip-installed CUDA)."""
@@ -43,20 +58,99 @@ def predict_single(image_path: str, hand_drawn: bool = False) -> str:
     return predict_SMILES(image_path, hand_drawn=hand_drawn)
 
 
+def load_model():
+    """Load DECIMER once per process and start the inference thread.
+
+    Returns (decimer module, inference executor). Safe to call from any
+    thread; only the first caller pays for the TensorFlow model load.
+    """
+    global _decimer, _inference_executor
+    if _decimer is None:
+        with _model_lock:
+            if _decimer is None:
+                from DECIMER import decimer
+                _inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="decimer")
+                _decimer = decimer
+    return _decimer, _inference_executor
+
+
+def predict_images(image_paths: list, hand_drawn: bool = False, confidence: bool = False,
+                   batch_size: int = PREDICT_BATCH_SIZE):
+    """Predict SMILES for multiple images, yielding (path, smiles, char_confidences, error) in order.
+
+    Runs the same preprocessing and model as predict_SMILES, but upcoming
+    batches are preprocessed on a thread pool, and queued for the model,
+    while the caller consumes the current one. DECIMER's exported models add
+    the batch axis themselves and accept exactly one image per call, so model
+    calls stay per image.
+    All model calls in the process go through one inference thread, so
+    concurrent callers queue their batches there instead of contending for
+    TensorFlow. image_paths may hold str, Path or os.DirEntry items, which
+    are yielded back as given. char_confidences is None unless confidence is set.
+    """
+    import tensorflow as tf
+
+    decimer, inference = load_model()
+    model = decimer.DECIMER_Hand_drawn if hand_drawn else decimer.DECIMER_V2
+
+    def preprocess(path):
+        try:
+            return decimer.pre_process.decode_image(os.fspath(path))
+        except Exception as e:
+            return e
+
+    def infer(image):
+        smiles, char_confidences, error = None, None, None
+        try:
+            if isinstance(image, Exception):
+                raise image
+            predicted_tokens, confidence_values = model(tf.constant(image))
+            smiles = decimer.utils.decoder(decimer.detokenize_output(predicted_tokens))
+            if confidence:
+                char_confidences = decimer.detokenize_output_add_confidence(
+                    predicted_tokens, confidence_values
+                )
+        except Exception as e:
+            error = str(e)
+        return smiles, char_confidences, error
+
+    batches = iter([image_paths[i:i + batch_size] for i in range(0, len(image_paths), batch_size)])
+    preprocessing = deque()  # (batch, iterator of preprocessed images)
+    queued = deque()  # (batch, futures on the inference thread)
+
+    with ThreadPoolExecutor(max_workers=PREPROCESS_WORKERS) as executor:
+
+        def start_preprocessing():
+            batch = next(batches, None)
+            if batch is not None:
+                preprocessing.append((batch, executor.map(preprocess, batch)))
+
+        for _ in range(PREFETCH_BATCHES):
+            start_preprocessing()
+
+        while preprocessing or queued:
+            # Keep the model a batch ahead of the caller so it never idles
+            # while results are being consumed
+            while preprocessing and len(queued) < PREFETCH_BATCHES:
+                batch, images = preprocessing.popleft()
+                start_preprocessing()
+                queued.append((batch, [inference.submit(infer, image) for image in images]))
+
+            batch, predictions = queued.popleft()
+            for path, prediction in zip(batch, predictions):
+                yield (path, *prediction.result())
+
+
 def predict_batch(image_paths: list, hand_drawn: bool = False, verbose: bool = True) -> list:
     """Predict SMILES for multiple images."""
-    from DECIMER import predict_SMILES
     from tqdm import tqdm
 
     results = []
-    iterator = tqdm(image_paths, desc="Processing") if verbose else image_paths
+    predictions = predict_images(image_paths, hand_drawn=hand_drawn)
+    iterator = tqdm(predictions, desc="Processing", total=len(image_paths)) if verbose else predictions
 
-    for path in iterator:
-        try:
-            smiles = predict_SMILES(str(path), hand_drawn=hand_drawn)
-            results.append({"file": str(path), "smiles": smiles, "error": None})
-        except Exception as e:
-            results.append({"file": str(path), "smiles": None, "error": str(e)})
+    for path, smiles, _, error in iterator:
+        results.append({"file": str(path), "smiles": smiles, "error": error})
 
     return results
 
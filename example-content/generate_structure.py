@@ -2,6 +2,7 @@
 import json
 import os
 import re
+from functools import lru_cache
 
 filenames = [
     "sequence_01.png", "sequence_02.png", "sequence_03.png", "sequence_04.png", 
@@ -27,29 +28,16 @@ filenames = [
     "sequence_32.png", "sequence_33.png"
 ]
 
+_NUM_RE = re.compile(r'\d+')
+
+
+@lru_cache(maxsize=None)
 def parse_filename(filename):
-    # Remove extension
-    name = os.path.splitext(filename)[0]
-    # Split by _
-    parts = name.split('_')
-    
     # sequence_18 -> id="18"
     # sequence_18_sub_01 -> id="18.1"
     # sequence_18_sub_01_sub_05 -> id="18.1.5"
-    
-    # Identify numbers
-    ids = []
-    for part in parts:
-        if part.isdigit():
-            ids.append(str(int(part))) # remove leading zeros
-            
-    step_id = ".".join(ids)
-    # sequence_18 -> parts: sequence, 18. ids: 18.
-    # Actually checking the pattern:
-    # sequence_X -> X
-    # sequence_X_sub_Y -> X.Y
-    
-    return step_id
+    name = os.path.splitext(filename)[0]
+    return ".".join(str(int(n)) for n in _NUM_RE.findall(name))  # remove leading zeros
 
 def create_step_object(step_id, filename):
     return {
@@ -70,34 +58,32 @@ def create_step_object(step_id, filename):
 # ID 18.1 parent is 18.
 # ID 18.1.1 parent is 18.1.
 
-steps_map = {} # Map id -> object
-
-# Sort filenames to ensure parents come before children generally, but dictionary map handles it.
+# Sorting puts every parent directly before its children ('.' sorts before '_'),
+# so one pass with a stack of the current ancestor chain links everything.
 filenames.sort()
 
 root_steps = []
+stack = [] # (id prefix "18.1.", depth, object) for the current ancestor chain
 
-# First pass: Create all objects
 for f in filenames:
     sid = parse_filename(f)
-    step_obj = create_step_object(sid, f)
-    steps_map[sid] = step_obj
+    obj = create_step_object(sid, f)
+    depth = sid.count('.')
 
-# Second pass: Link them
-for f in filenames:
-    sid = parse_filename(f)
-    obj = steps_map[sid]
-    
-    if '.' in sid:
-        parent_id = sid.rsplit('.', 1)[0]
-        if parent_id in steps_map:
-            steps_map[parent_id]['substeps'].append(obj)
-        else:
-            # Fallback if parent missing (should not happen in this dataset)
-            root_steps.append(obj)
+    # Drop finished branches until the top is an ancestor of this step
+    while stack and not sid.startswith(stack[-1][0]):
+        stack.pop()
+
+    if depth == 0:
+        root_steps.append(obj)
+    elif stack and stack[-1][1] == depth - 1:
+        stack[-1][2]['substeps'].append(obj)
     else:
+        # Fallback if parent missing (should not happen in this dataset)
         root_steps.append(obj)
 
+    stack.append((sid + '.', depth, obj))
+
 # Construct final JSON
 output = {
     "$schema": "../schema.json",
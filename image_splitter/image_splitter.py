@@ -18,24 +18,95 @@ CRITICAL RULES - MUST FOLLOW WHEN MODIFYING THIS SCRIPT:
 
 from PIL import Image
 import numpy as np
+import json
+import os
 from pathlib import Path
 from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
+from fnmatch import fnmatch
+
+try:
+    from numba import njit, prange, set_num_threads
+except ImportError:
+    njit = None
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
+
+# Rows sampled when looking for candidate white split columns
+COLUMN_SAMPLE_STRIDE = 8
+
+# Per-output-directory cache of detected layouts, keyed by input file name
+SPLITS_CACHE_NAME = ".splits_cache.json"
+
+# Same-size images handed to a worker together, so the NumPy detection
+# reductions run once over an (N, H, W, 3) stack
+DETECT_BATCH_SIZE = 8
+
+# zlib level for the saved slices (1 = fastest; output pixels are identical at any level)
+PNG_COMPRESS_LEVEL = 1
+
+# Lossless output formats for the saved slices: format -> (file extension, save options).
+# PNG is what the downstream SMILES extraction expects; WEBP (fast lossless
+# mode) and BMP (uncompressed) trade disk space for much cheaper encoding
+# when the slices are only intermediate files
+OUTPUT_FORMATS = {
+    "PNG": (".png", {"compress_level": PNG_COMPRESS_LEVEL}),
+    "WEBP": (".webp", {"lossless": True, "method": 0}),
+    "BMP": (".bmp", {}),
+}
+
+
+# Orange detection thresholds. Kept as uint8 scalars (like every threshold
+# below) so comparisons against uint8 pixels run NumPy's byte-wide kernels;
+# a NumPy int64 scalar would promote the whole comparison to int64
+ORANGE_R_MIN = np.uint8(200)
+ORANGE_G_MIN = np.uint8(50)
+ORANGE_G_MAX = np.uint8(200)
+ORANGE_B_MAX = np.uint8(150)
+
+
+def orange_mask(img_array: np.ndarray) -> np.ndarray:
+    """Boolean HxW mask of orange pixels (high R, medium G, low B) in a uint8 RGB array."""
+    r, g, b = img_array[..., 0], img_array[..., 1], img_array[..., 2]
+    # Orange has R much higher than B, and G somewhere in between
+    return (r > ORANGE_R_MIN) & (g > ORANGE_G_MIN) & (g < ORANGE_G_MAX) & (b < ORANGE_B_MAX)
 
 
-def is_orange_pixel(pixel) -> bool:
-    """Check if a pixel is orange (high R, medium G, low B)."""
-    r, g, b = int(pixel[0]), int(pixel[1]), int(pixel[2])
-    # Orange has R much higher than B, and G somewhere in between
-    return r > 200 and 50 < g < 200 and b < 150
+def white_mask(img_array: np.ndarray, threshold: int = 250) -> np.ndarray:
+    """Boolean HxW mask of white pixels (every channel above threshold) in a uint8 RGB array."""
+    threshold = np.uint8(threshold)
+    r, g, b = img_array[..., 0], img_array[..., 1], img_array[..., 2]
+    return (r > threshold) & (g > threshold) & (b > threshold)
+
+
+def bounds_from_orange_rows(row_orange: np.ndarray) -> tuple[int, int]:
+    """
+    Find (top_y, bottom_y) of the content from a per-row "has orange" vector.
+
+    Header ends at the first non-orange row after the first orange run from
+    the top; footer starts where the last orange run from the bottom begins.
+    """
+    height = row_orange.shape[0]
+    orange_rows = np.flatnonzero(row_orange)
+
+    if orange_rows.size == 0:
+        return 0, height
+
+    # Header bottom: first non-orange row after the first orange run from the top
+    first = orange_rows[0]
+    after_header = np.flatnonzero(~row_orange[first:])
+    top_y = int(first + after_header[0]) if after_header.size else height
 
+    # Footer top: 1 pixel below the first non-orange row above the last orange run
+    last = orange_rows[-1]
+    above_footer = np.flatnonzero(~row_orange[:last + 1])
+    bottom_y = int(above_footer[-1] + 1) if above_footer.size else height
 
-def row_has_orange(row) -> bool:
-    """Check if a row has any orange pixels."""
-    for pixel in row:
-        if is_orange_pixel(pixel):
-            return True
-    return False
+    return top_y, bottom_y
 
 
 def find_content_bounds(img_array: np.ndarray) -> tuple[int, int]:
@@ -49,38 +120,21 @@ def find_content_bounds(img_array: np.ndarray) -> tuple[int, int]:
     Returns (top_y, bottom_y) coordinates.
     """
     height = img_array.shape[0]
+    third = height // 3
 
-    # Find header bottom: scan from top until we pass through orange area
-    top_y = 0
-    in_header = False
-    for y in range(height):
-        row = img_array[y]
-        if row_has_orange(row):
-            in_header = True
-            top_y = y + 1  # 1 pixel below this orange row
-        elif in_header:
-            # We were in header and now hit non-orange, header is done
-            break
-
-    # Find footer top: scan from bottom up until we pass through orange area
-    bottom_y = height
-    in_footer = False
-    for y in range(height - 1, -1, -1):
-        row = img_array[y]
-        if row_has_orange(row):
-            in_footer = True
-        elif in_footer:
-            # We passed through orange footer and hit content area
-            bottom_y = y + 1  # Cut 1 pixel above the footer
-            break
-
-    return top_y, bottom_y
-
+    # Headers and footers are short, so first look for them in the top and
+    # bottom thirds only. A slab settles its bound if it holds both the orange
+    # run and the non-orange row that ends it; otherwise scan every row. The
+    # result is the same as the full scan either way.
+    if third:
+        header_rows = orange_mask(img_array[:third]).any(axis=1)
+        footer_rows = orange_mask(img_array[height - third:]).any(axis=1)
+        top_y, _ = bounds_from_orange_rows(header_rows)
+        _, footer_y = bounds_from_orange_rows(footer_rows)
+        if header_rows.any() and top_y < third and footer_y < third:
+            return top_y, height - third + footer_y
 
-def is_column_completely_white(img_array: np.ndarray, x: int, threshold: int = 250) -> bool:
-    """Check if a column is COMPLETELY white (all pixels white)."""
-    col = img_array[:, x]
-    return np.all(col > threshold)
+    return bounds_from_orange_rows(orange_mask(img_array).any(axis=1))
 
 
 def find_white_column_splits(img_array: np.ndarray, threshold: int = 250) -> list[int]:
@@ -95,31 +149,135 @@ def find_white_column_splits(img_array: np.ndarray, threshold: int = 250) -> lis
     """
     height, width = img_array.shape[:2]
     center = width // 2
+    threshold = np.uint8(threshold)
+
+    # Columns white in every COLUMN_SAMPLE_STRIDE-th row are candidates; a
+    # candidate only counts once it is confirmed white over the full height,
+    # so sampling never changes the result
+    candidates = np.flatnonzero(white_mask(img_array[::COLUMN_SAMPLE_STRIDE], threshold).all(axis=0))
+
+    def is_completely_white(x) -> bool:
+        # Inverted predicate: one comparison and one reduction over the column's
+        # H x 3 values, instead of three channel compares, two ANDs and a reduction
+        return not (img_array[:, x] <= threshold).any()
+
+    # Nearest completely white column at or left / right of center,
+    # falling back to thirds of the width if none is found
+    left_split = next((int(x) for x in candidates[candidates <= center][::-1] if is_completely_white(x)),
+                      width // 3)
+    right_split = next((int(x) for x in candidates[candidates >= center] if is_completely_white(x)),
+                       2 * width // 3)
+
+    return [left_split, right_split]
 
-    # Scan LEFT from center to find first completely white column
-    left_split = None
-    for x in range(center, -1, -1):
-        if is_column_completely_white(img_array, x, threshold):
-            left_split = x
-            break
-
-    # Scan RIGHT from center to find first completely white column
-    right_split = None
-    for x in range(center, width):
-        if is_column_completely_white(img_array, x, threshold):
-            right_split = x
-            break
-
-    # Handle cases where no white column was found
-    if left_split is None:
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _scan_layout(img_array, threshold):
+        """
+        Numba version of find_content_bounds + find_white_column_splits in one
+        pass over the pixels, without temporary masks. Same rules, same results.
+
+        Returns (top_y, bottom_y, left_split, right_split).
+        """
+        height, width = img_array.shape[0], img_array.shape[1]
+
+        # Per-row "has orange" flags, rows in parallel
+        row_orange = np.zeros(height, np.bool_)
+        for y in prange(height):
+            for x in range(width):
+                r, g, b = img_array[y, x, 0], img_array[y, x, 1], img_array[y, x, 2]
+                if r > ORANGE_R_MIN and g > ORANGE_G_MIN and g < ORANGE_G_MAX and b < ORANGE_B_MAX:
+                    row_orange[y] = True
+                    break
+
+        # Content bounds, as in bounds_from_orange_rows
+        top_y, bottom_y = 0, height
+        first = -1
+        for y in range(height):
+            if row_orange[y]:
+                first = y
+                break
+        if first >= 0:
+            top_y = height
+            for y in range(first, height):
+                if not row_orange[y]:
+                    top_y = y
+                    break
+            last = first
+            for y in range(height - 1, -1, -1):
+                if row_orange[y]:
+                    last = y
+                    break
+            bottom_y = height
+            for y in range(last, -1, -1):
+                if not row_orange[y]:
+                    bottom_y = y + 1
+                    break
+
+        # Per-column "white over the whole content height" flags, columns in parallel
+        col_white = np.ones(width, np.bool_)
+        for x in prange(width):
+            for y in range(top_y, bottom_y):
+                if (img_array[y, x, 0] <= threshold or img_array[y, x, 1] <= threshold
+                        or img_array[y, x, 2] <= threshold):
+                    col_white[x] = False
+                    break
+
+        # Nearest white column at or left / right of center, as in find_white_column_splits
+        center = width // 2
         left_split = width // 3
-    if right_split is None:
+        for x in range(center, -1, -1):
+            if col_white[x]:
+                left_split = x
+                break
         right_split = 2 * width // 3
+        for x in range(center, width):
+            if col_white[x]:
+                right_split = x
+                break
+
+        return top_y, bottom_y, left_split, right_split
 
-    return [left_split, right_split]
 
+def detect_layout(img_array: np.ndarray, threshold: int = 250) -> tuple[int, int, list[int]]:
+    """
+    Detect (top_y, bottom_y, splits) for an RGB pixel array.
 
-def split_image(image_path: str, output_dir: str = None, verbose: bool = True) -> dict[str, Image.Image]:
+    Uses the Numba kernel when numba is installed, otherwise
+    find_content_bounds + find_white_column_splits.
+    """
+    if njit is not None:
+        top_y, bottom_y, left_split, right_split = _scan_layout(img_array, np.uint8(threshold))
+        return top_y, bottom_y, [left_split, right_split]
+
+    top_y, bottom_y = find_content_bounds(img_array)
+    # Split columns are searched in the content area (full height between header and footer)
+    splits = find_white_column_splits(img_array[top_y:bottom_y, :], threshold)
+    return top_y, bottom_y, splits
+
+
+def detect_layouts(arrays: list[np.ndarray], threshold: int = 250) -> list[tuple[int, int, list[int]]]:
+    """
+    Detect layouts for several same-size RGB pixel arrays, like detect_layout.
+
+    Without numba the per-row orange flags are computed for the whole stack
+    in one reduction. The Numba kernel already runs per image without
+    temporaries, so stacking would only add a copy there.
+    """
+    if njit is not None or len(arrays) < 2:
+        return [detect_layout(a, threshold) for a in arrays]
+
+    row_orange = orange_mask(np.stack(arrays)).any(axis=2)  # (N, H)
+    layouts = []
+    for img_array, rows in zip(arrays, row_orange):
+        top_y, bottom_y = bounds_from_orange_rows(rows)
+        layouts.append((top_y, bottom_y, find_white_column_splits(img_array[top_y:bottom_y, :], threshold)))
+    return layouts
+
+
+def split_image(image_path: str, output_dir: str = None, verbose: bool = True,
+                layout: tuple = None, output_format: str = "PNG") -> dict[str, Image.Image]:
     """
     Split an image into Left, Middle, Right sections.
 
@@ -130,35 +288,52 @@ def split_image(image_path: str, output_dir: str = None, verbose: bool = True) -
         image_path: Path to the input image
         output_dir: Optional directory to save the output images
         verbose: Print progress messages
+        layout: Optional (top_y, bottom_y, splits) from an earlier run, skips detection
+        output_format: Format of the saved images, a key of OUTPUT_FORMATS
 
     Returns:
         Dictionary with 'left', 'middle', 'right' keys and PIL Image values
     """
-    img = Image.open(image_path).convert('RGB')
-    img_array = np.array(img)
+    return _split_image(image_path, output_dir, verbose, layout, output_format=output_format)[0]
 
-    height, width = img_array.shape[:2]
 
-    # Step 1: Find content bounds (remove header/footer)
-    top_y, bottom_y = find_content_bounds(img_array)
+def load_rgb_array(image_path: str) -> np.ndarray:
+    """Decode an image into a read-only HxWx3 uint8 array with as few full-frame copies as possible."""
+    img = Image.open(image_path)
+    # convert() copies the frame even when the mode already matches
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return np.asarray(img)  # read-only view, no second copy of the pixels
+
 
-    # Step 2: Extract content area (full height between header and footer)
-    content = img_array[top_y:bottom_y, :]
+def _split_image(image_path: str, output_dir: str, verbose: bool, layout: tuple,
+                 img_array: np.ndarray = None, output_format: str = "PNG") -> tuple[dict, tuple]:
+    """split_image, also returning the (top_y, bottom_y, splits) layout it used."""
+    if img_array is None:
+        img_array = load_rgb_array(image_path)
 
-    # Step 3: Find white column splits in the content area
-    splits = find_white_column_splits(content)
+    # Steps 1-3: Find content bounds (remove header/footer), then white
+    # column splits in the content area
+    if layout is None:
+        layout = detect_layout(img_array)
+    top_y, bottom_y, splits = layout
 
     if verbose:
         print(f"Content bounds: top={top_y}, bottom={bottom_y}")
         print(f"Content area: y={top_y} to {bottom_y}")
         print(f"Split points: x={splits}")
 
-    # Step 4: Cut into Left, Middle, Right
+    # Step 4: Cut into Left, Middle, Right by slicing the pixel array we already have
     results = {}
 
-    left_img = img.crop((0, top_y, splits[0], bottom_y))
-    middle_img = img.crop((splits[0], top_y, splits[1], bottom_y))
-    right_img = img.crop((splits[1], top_y, width, bottom_y))
+    # Slicing would silently give empty parts where crop() raised, so check first
+    if bottom_y < top_y or splits[1] < splits[0]:
+        raise ValueError(f"Invalid layout: bounds={top_y}..{bottom_y}, splits={splits}")
+
+    content = img_array[top_y:bottom_y]
+    left_img = Image.fromarray(content[:, :splits[0]])
+    middle_img = Image.fromarray(content[:, splits[0]:splits[1]])
+    right_img = Image.fromarray(content[:, splits[1]:])
 
     results['left'] = left_img
     results['middle'] = middle_img
@@ -170,63 +345,262 @@ def split_image(image_path: str, output_dir: str = None, verbose: bool = True) -
         out_path.mkdir(parents=True, exist_ok=True)
 
         stem = Path(image_path).stem
-        left_img.save(out_path / f"{stem}_left.png")
-        middle_img.save(out_path / f"{stem}_middle.png")
-        right_img.save(out_path / f"{stem}_right.png")
+        # Fast, lossless encoding: it dominates the cost of small slices
+        ext, save_options = OUTPUT_FORMATS[output_format]
+        left_img.save(out_path / f"{stem}_left{ext}", format=output_format, **save_options)
+        middle_img.save(out_path / f"{stem}_middle{ext}", format=output_format, **save_options)
+        right_img.save(out_path / f"{stem}_right{ext}", format=output_format, **save_options)
         if verbose:
             print(f"Saved to {out_path}")
 
-    return results
+    return results, (top_y, bottom_y, splits)
 
 
-def _process_single_image(args: tuple) -> tuple[str, bool, str]:
-    """Worker function for parallel processing. Returns (filename, success, error_msg)."""
-    image_path, output_dir = args
-    try:
-        split_image(image_path, output_dir, verbose=False)
-        return (Path(image_path).name, True, "")
-    except Exception as e:
-        return (Path(image_path).name, False, str(e))
+def _process_single_image(args: tuple, output_format: str = "PNG") -> tuple[str, bool, str, tuple]:
+    """Worker function for parallel processing. Returns (filename, success, error_msg, layout)."""
+    return _process_image_group([args], output_format)[0]
 
 
-def process_batch(input_dir: str, output_dir: str, pattern: str = "*.png"):
-    """Process all matching images in a directory (sequential)."""
-    input_path = Path(input_dir)
-    for img_file in input_path.glob(pattern):
-        print(f"\nProcessing: {img_file.name}")
+def _process_image_group(group: list[tuple], output_format: str = "PNG") -> list[tuple[str, bool, str, tuple]]:
+    """
+    Worker function for a group of same-size images; see _process_single_image.
+
+    Layouts missing from the arguments are detected for the whole group at once.
+    """
+    results = []
+    loaded = []
+    for image_path, output_dir, layout in group:
         try:
-            split_image(str(img_file), output_dir)
+            loaded.append((image_path, output_dir, layout, load_rgb_array(image_path)))
         except Exception as e:
-            print(f"  Error: {e}")
+            results.append((os.path.basename(image_path), False, str(e), None))
 
+    detected = {}
+    todo = [item for item in loaded if item[2] is None]
+    try:
+        detected = dict(zip((item[0] for item in todo), detect_layouts([item[3] for item in todo])))
+    except Exception:
+        pass  # detect per image below, so each file reports its own error
+
+    for image_path, output_dir, layout, img_array in loaded:
+        try:
+            _, layout = _split_image(image_path, output_dir, False, layout or detected.get(image_path), img_array,
+                                     output_format)
+            results.append((os.path.basename(image_path), True, "", layout))
+        except Exception as e:
+            results.append((os.path.basename(image_path), False, str(e), None))
+    return results
 
-def process_batch_parallel(input_dir: str, output_dir: str, pattern: str = "*.png", num_workers: int = 8):
-    """Process all matching images in a directory using parallel workers."""
-    input_path = Path(input_dir)
-    image_files = list(input_path.glob(pattern))
 
-    if not image_files:
+def _group_by_size(args: list[tuple], group_size: int = DETECT_BATCH_SIZE) -> list[list[tuple]]:
+    """Group worker arguments into runs of up to group_size images with the same dimensions."""
+    by_size = {}
+    for arg in args:
+        try:
+            with Image.open(arg[0]) as img:
+                size = img.size  # header only, pixels are not decoded
+        except Exception:
+            size = None  # unreadable: the worker reports the error
+        by_size.setdefault(size, []).append(arg)
+    return [same[i:i + group_size] for same in by_size.values() for i in range(0, len(same), group_size)]
+
+
+def load_splits_cache(output_dir: str) -> dict:
+    """Load {filename: [mtime_ns, size, top_y, bottom_y, left_split, right_split]} for output_dir."""
+    try:
+        with open(Path(output_dir) / SPLITS_CACHE_NAME, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_splits_cache(output_dir: str, cache: dict):
+    """Write the layout cache for output_dir (via a temp file, so a crash never leaves it half-written)."""
+    path = Path(output_dir) / SPLITS_CACHE_NAME
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp, path)
+
+
+def process_batch(input_dir, output_dir: str, pattern="*.png", output_format: str = "PNG"):
+    """Process all matching images in a directory (sequential).
+
+    Shows a progress bar when tqdm is installed and prints one summary at
+    the end. Returns (success_count, error_count).
+    """
+    args, keys, cache = _prepare_batch(input_dir, output_dir, pattern, output_format)
+    if not args:
         return 0, 0
 
+    try:
+        worker = partial(_process_single_image, output_format=output_format)
+        success, errors = _collect_results(map(worker, args), keys, cache,
+                                           progress=len(args))
+    finally:
+        save_splits_cache(output_dir, cache)
+
+    print(f"Processed {len(args)} images: {success} ok, {errors} errors")
+    return success, errors
+
+
+def list_images(input_dir: str, extensions: tuple = (".png", ".jpg")) -> list[str]:
+    """
+    Paths of the files in input_dir with one of the given extensions, from a
+    single directory scan. Extensions match case-insensitively where the OS
+    does (Windows), like glob.
+    """
+    with os.scandir(input_dir) as entries:
+        return [entry.path for entry in entries
+                if os.path.normcase(entry.name).endswith(extensions) and entry.is_file()]
+
+
+def _prepare_batch(input_dir, output_dir: str, pattern, output_format: str = "PNG") -> tuple[list, dict, dict]:
+    """
+    Collect worker arguments for all matching images in input_dir, or for
+    the image paths in it if it is a list (pattern is then ignored).
+
+    Returns (args, keys, cache): args are (image_path, output_dir, layout)
+    tuples, with layouts cached from earlier runs passed on for files that
+    have not changed since (same mtime and size).
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format {output_format!r}, expected one of {list(OUTPUT_FORMATS)}")
+
+    # (path, name, stat) per image. One scandir pass gives plain-string paths
+    # and, on Windows, stat data straight from the directory listing; fnmatch
+    # matches names the same way glob does
+    if isinstance(input_dir, (str, os.PathLike)):
+        patterns = (pattern,) if isinstance(pattern, str) else pattern
+        with os.scandir(input_dir) as it:
+            images = [(entry.path, entry.name, entry.stat()) for entry in it
+                      if any(fnmatch(entry.name, p) for p in patterns) and entry.is_file()]
+    else:
+        images = [(os.fspath(f), os.path.basename(f), os.stat(f)) for f in input_dir]
+
+    if not images:
+        return [], {}, {}
+
     # Create output directory
     Path(output_dir).mkdir(parents=True, exist_ok=True)
 
-    # Prepare arguments for workers
-    args = [(str(img_file), output_dir) for img_file in image_files]
+    cache = load_splits_cache(output_dir)
+    keys = {}
+    args = []
+    for image_path, name, st in images:
+        keys[name] = key = [st.st_mtime_ns, st.st_size]
+        cached = cache.get(name)
+        layout = None
+        if cached and cached[:2] == key:
+            top_y, bottom_y, left_split, right_split = cached[2:]
+            layout = (top_y, bottom_y, [left_split, right_split])
+        args.append((image_path, output_dir, layout))
+
+    return args, keys, cache
+
+
+def _collect_results(results, keys: dict, cache: dict, progress: int = 0) -> tuple[int, int]:
+    """
+    Count worker results, recording successful layouts in cache. Returns (success, errors).
+
+    Errors are printed together once all results are in. Pass progress=<total
+    images> to show a tqdm progress bar meanwhile (when tqdm is installed).
+    """
+    if progress and tqdm is not None:
+        results = tqdm(results, total=progress, desc="Splitting", unit="img", leave=False)
 
-    # Process in parallel
     success_count = 0
-    error_count = 0
+    failures = []
+    for filename, success, error_msg, layout in results:
+        if success:
+            success_count += 1
+            top_y, bottom_y, splits = layout
+            cache[filename] = keys[filename] + [top_y, bottom_y, *splits]
+        else:
+            failures.append((filename, error_msg))
+
+    for filename, error_msg in failures:
+        print(f"  Error processing {filename}: {error_msg}")
+    return success_count, len(failures)
+
+
+def init_pool_worker():
+    """Pool initializer: keep the Numba kernel single-threaded in each worker process.
+
+    The pool already runs one image per core; a full-size Numba thread pool
+    in every worker would oversubscribe the CPU (workers x cores threads).
+    """
+    if njit is not None:
+        set_num_threads(1)
 
-    with Pool(num_workers) as pool:
-        for filename, success, error_msg in pool.imap_unordered(_process_single_image, args):
-            if success:
-                success_count += 1
-            else:
-                error_count += 1
-                print(f"  Error processing {filename}: {error_msg}")
 
-    return success_count, error_count
+def process_batch_parallel(input_dir, output_dir: str, pattern="*.png", num_workers: int = 8,
+                           pool: Pool = None, progress: bool = False, output_format: str = "PNG"):
+    """Process all matching images in a directory using parallel workers.
+
+    pattern may be a single glob or a tuple of globs, e.g. ("*.png", "*.jpg"),
+    which are processed as one batch. input_dir may also be a list of image
+    paths (e.g. from list_images), which skips the glob. Pass a pool to reuse its worker
+    processes across calls instead of starting num_workers new ones; create
+    it with initializer=init_pool_worker.
+    progress shows a tqdm progress bar (when installed). output_format is
+    a key of OUTPUT_FORMATS.
+    """
+    args, keys, cache = _prepare_batch(input_dir, output_dir, pattern, output_format)
+    if not args:
+        return 0, 0
+
+    # Workers get groups of same-size images; groups are handed out in chunks
+    # so IPC/pickling is paid per chunk, while still leaving ~4 chunks per
+    # worker for load balancing
+    groups = _group_by_size(args)
+    chunksize = max(1, len(groups) // (num_workers * 4))
+
+    own_pool = pool is None
+    if own_pool:
+        pool = Pool(num_workers, initializer=init_pool_worker)
+    try:
+        worker = partial(_process_image_group, output_format=output_format)
+        results = pool.imap_unordered(worker, groups, chunksize=chunksize)
+        return _collect_results((r for group in results for r in group), keys, cache,
+                                progress=progress and len(args))
+    finally:
+        if own_pool:
+            pool.close()
+            pool.join()
+        save_splits_cache(output_dir, cache)
+
+
+def process_batch_threaded(input_dir, output_dir: str, pattern="*.png", num_workers: int = 8,
+                           progress: bool = False, output_format: str = "PNG"):
+    """Process all matching images in a directory using a thread pool.
+
+    Most of the per-image time goes to PNG decode/encode and NumPy reductions,
+    which release the GIL. Threads therefore use several cores without the
+    process start-up and pickling cost of process_batch_parallel, which is
+    still the better choice when numba is not installed and detection
+    dominates. The Numba kernel does not release the GIL, so detection runs
+    one image at a time (itself spread over cores by prange); that also keeps
+    its parallel=True launches safe under Numba's default workqueue layer.
+    Same arguments and return value as process_batch_parallel.
+    """
+    args, keys, cache = _prepare_batch(input_dir, output_dir, pattern, output_format)
+    if not args:
+        return 0, 0
+
+    if njit is not None:
+        # Compile / load the kernel and start Numba's thread pool from this
+        # thread; first calls racing in from worker threads can hang at exit
+        detect_layout(np.full((1, 1, 3), 255, np.uint8))
+
+    try:
+        with ThreadPoolExecutor(num_workers) as executor:
+            worker = partial(_process_image_group, output_format=output_format)
+            results = executor.map(worker, _group_by_size(args))
+            return _collect_results((r for group in results for r in group), keys, cache,
+                                    progress=progress and len(args))
+    finally:
+        save_splits_cache(output_dir, cache)
 
 
 if __name__ == "__main__":
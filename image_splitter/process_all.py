@@ -3,8 +3,9 @@ Process ALL directories in D:\chemistry-scraped using 8 parallel workers.
 """
 
 import time
+from multiprocessing import Pool
 from pathlib import Path
-from image_splitter import process_batch_parallel
+from image_splitter import init_pool_worker, list_images, process_batch_parallel
 
 BASE_DIR = Path(r"D:\chemistry-scraped")
 NUM_WORKERS = 8
@@ -21,41 +22,35 @@ def main():
     total_errors = 0
     total_images = 0
 
-    for i, dir_path in enumerate(directories, 1):
-        output_dir = dir_path / "output"
+    # One pool for all directories, so worker processes start only once
+    with Pool(NUM_WORKERS, initializer=init_pool_worker) as pool:
+        for i, dir_path in enumerate(directories, 1):
+            output_dir = dir_path / "output"
 
-        # Count images in this directory
-        png_files = list(dir_path.glob("*.png"))
-        jpg_files = list(dir_path.glob("*.jpg"))
-        num_images = len(png_files) + len(jpg_files)
+            # List PNG and JPG images in this directory with a single scan
+            image_files = list_images(dir_path)
+            num_images = len(image_files)
 
-        if num_images == 0:
-            print(f"[{i}/{len(directories)}] {dir_path.name}: No images, skipping")
-            continue
+            if num_images == 0:
+                print(f"[{i}/{len(directories)}] {dir_path.name}: No images, skipping")
+                continue
 
-        print(f"[{i}/{len(directories)}] {dir_path.name}: {num_images} images...", end=" ", flush=True)
+            print(f"[{i}/{len(directories)}] {dir_path.name}: {num_images} images...", end=" ", flush=True)
 
-        dir_start = time.time()
+            dir_start = time.time()
 
-        # Process PNG files
-        success_png, errors_png = process_batch_parallel(
-            str(dir_path), str(output_dir), "*.png", NUM_WORKERS
-        )
+            # Process PNG and JPG files as one batch on the shared pool
+            success, errors = process_batch_parallel(
+                image_files, str(output_dir), num_workers=NUM_WORKERS, pool=pool
+            )
 
-        # Process JPG files
-        success_jpg, errors_jpg = process_batch_parallel(
-            str(dir_path), str(output_dir), "*.jpg", NUM_WORKERS
-        )
+            dir_elapsed = time.time() - dir_start
 
-        dir_elapsed = time.time() - dir_start
-        success = success_png + success_jpg
-        errors = errors_png + errors_jpg
+            print(f"Done in {dir_elapsed:.1f}s ({success} ok, {errors} errors)")
 
-        print(f"Done in {dir_elapsed:.1f}s ({success} ok, {errors} errors)")
-
-        total_success += success
-        total_errors += errors
-        total_images += num_images
+            total_success += success
+            total_errors += errors
+            total_images += num_images
 
     elapsed = time.time() - start_time
     print(f"\n{'='*60}")
@@ -12,8 +12,7 @@ if __name__ == "__main__":
     print(f"Output directory: {OUTPUT_DIR}")
     print()
 
-    # Process PNG and JPG files
-    process_batch(INPUT_DIR, OUTPUT_DIR, "*.png")
-    process_batch(INPUT_DIR, OUTPUT_DIR, "*.jpg")
+    # Process PNG and JPG files as one batch
+    process_batch(INPUT_DIR, OUTPUT_DIR, ("*.png", "*.jpg"))
 
     print("\nDone!")
@@ -4,8 +4,9 @@ Process directories that are missing output folders.
 
 import time
 import sys
+from multiprocessing import Pool
 from pathlib import Path
-from image_splitter import process_batch_parallel
+from image_splitter import init_pool_worker, list_images, process_batch_parallel
 
 # Fix Windows console encoding
 sys.stdout.reconfigure(encoding='utf-8', errors='replace')
@@ -17,49 +18,43 @@ NUM_WORKERS = 8
 def main():
     start_time = time.time()
 
-    # Find directories missing output
+    # Find directories missing output, keeping each one's PNG/JPG list
+    # from a single scan
     all_dirs = [d for d in BASE_DIR.iterdir() if d.is_dir()]
     missing_dirs = []
 
     for d in all_dirs:
         output_dir = d / "output"
         if not output_dir.exists():
-            png_count = len(list(d.glob("*.png")))
-            jpg_count = len(list(d.glob("*.jpg")))
-            if png_count + jpg_count > 0:
-                missing_dirs.append(d)
+            image_files = list_images(d)
+            if image_files:
+                missing_dirs.append((d, image_files))
 
     print(f"Found {len(missing_dirs)} directories missing output")
 
     total_success = 0
     total_errors = 0
 
-    for i, dir_path in enumerate(missing_dirs, 1):
-        output_dir = dir_path / "output"
+    # One pool for all directories, so worker processes start only once
+    with Pool(NUM_WORKERS, initializer=init_pool_worker) as pool:
+        for i, (dir_path, image_files) in enumerate(missing_dirs, 1):
+            output_dir = dir_path / "output"
+            num_images = len(image_files)
 
-        png_files = list(dir_path.glob("*.png"))
-        jpg_files = list(dir_path.glob("*.jpg"))
-        num_images = len(png_files) + len(jpg_files)
+            print(f"[{i}/{len(missing_dirs)}] {dir_path.name}: {num_images} images...", end=" ", flush=True)
 
-        print(f"[{i}/{len(missing_dirs)}] {dir_path.name}: {num_images} images...", end=" ", flush=True)
+            dir_start = time.time()
 
-        dir_start = time.time()
+            success, errors = process_batch_parallel(
+                image_files, str(output_dir), num_workers=NUM_WORKERS, pool=pool
+            )
 
-        success_png, errors_png = process_batch_parallel(
-            str(dir_path), str(output_dir), "*.png", NUM_WORKERS
-        )
-        success_jpg, errors_jpg = process_batch_parallel(
-            str(dir_path), str(output_dir), "*.jpg", NUM_WORKERS
-        )
+            dir_elapsed = time.time() - dir_start
 
-        dir_elapsed = time.time() - dir_start
-        success = success_png + success_jpg
-        errors = errors_png + errors_jpg
+            print(f"Done in {dir_elapsed:.1f}s ({success} ok, {errors} errors)")
 
-        print(f"Done in {dir_elapsed:.1f}s ({success} ok, {errors} errors)")
-
-        total_success += success
-        total_errors += errors
+            total_success += success
+            total_errors += errors
 
     elapsed = time.time() - start_time
     print(f"\n{'='*60}")
@@ -17,10 +17,13 @@ Usage:
 """
 
 import argparse
+import csv
+import io
 import json
 import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
@@ -28,12 +31,138 @@ import psycopg2
 from dotenv import load_dotenv
 from google import genai
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # Installed with google-genai, which uses it as its HTTP client
+    import httpx
+except ImportError:
+    httpx = None
+
 # Load environment variables
 load_dotenv()
 
 # Batch job tracking file
 BATCH_JOBS_FILE = Path(__file__).parent / "batch_jobs.json"
 
+# synthesis_steps columns written by the batch import, in row-tuple order
+STEP_COLUMNS = """
+    synthesis_id, image_filename,
+    original_reactant_smiles, original_reagent_smiles, original_product_smiles,
+    corrected_reactant_smiles, corrected_reagent_smiles, corrected_product_smiles,
+    reagents, conditions, yield, reaction_type, notes,
+    corrections_made, continuity,
+    llm_model, llm_cost, tokens_used, processed_at
+"""
+
+# llm_model recorded for rows imported from batch results
+BATCH_MODEL = "gemini-3-flash-batch"
+
+# Gemini 3 Flash batch pricing (50% discount) in cents per 1M tokens:
+# Input: $0.25/1M, Output: $1.50/1M (includes thinking)
+INPUT_CENTS_PER_M_TOKENS = 25
+OUTPUT_CENTS_PER_M_TOKENS = 150
+
+# Rows fetched per round trip when streaming the SMILES prefetch
+PREFETCH_ITERSIZE = 10000
+
+# Steps per prefetch query, so huge imports never send one giant array
+# (which can push the planner off the smiles_results index)
+PREFETCH_CHUNK_STEPS = 5000
+
+# Split image suffix (after the last "_") -> index of the step part it holds
+# in a SMILES record (reactant, reagent, product)
+STEP_PARTS = {"left.png": 0, "middle.png": 1, "right.png": 2}
+
+# SMILES record returned for steps without DECIMER results
+EMPTY_SMILES = ("", "", "")
+
+# Shared, read-only stand-in for a synthesis with no prefetched steps
+_NO_STEPS = {}
+
+# JSON wrapped in a markdown code fence, as LLM responses often are
+FENCE_RE = re.compile(r'```(?:json)?\s*\n?(.*?)\n?```', re.DOTALL)
+
+# NULL marker for the COPY staging rows. Empty strings stay empty strings
+# (an empty unquoted CSV field would otherwise mean NULL)
+COPY_NULL = r"\N"
+
+# Staging table with the same column types, created once per transaction
+STAGE_CREATE_SQL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS tmp_steps ON COMMIT DROP AS
+    SELECT {STEP_COLUMNS} FROM synthesis_steps WITH NO DATA
+"""
+STAGE_COPY_SQL = f"COPY tmp_steps ({STEP_COLUMNS}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+
+# Upsert of the staged rows, then emptying the staging table for the next batch.
+# One statement may not update the same row twice, so keep only the last
+# staged row per step (ctid follows COPY order in a fresh table)
+STAGE_MERGE_SQL = f"""
+    INSERT INTO synthesis_steps ({STEP_COLUMNS})
+    SELECT DISTINCT ON (synthesis_id, image_filename) {STEP_COLUMNS}
+    FROM tmp_steps
+    ORDER BY synthesis_id, image_filename, ctid DESC
+    ON CONFLICT (synthesis_id, image_filename) DO UPDATE SET
+        corrected_reactant_smiles = EXCLUDED.corrected_reactant_smiles,
+        corrected_reagent_smiles = EXCLUDED.corrected_reagent_smiles,
+        corrected_product_smiles = EXCLUDED.corrected_product_smiles,
+        reagents = EXCLUDED.reagents,
+        conditions = EXCLUDED.conditions,
+        yield = EXCLUDED.yield,
+        reaction_type = EXCLUDED.reaction_type,
+        notes = EXCLUDED.notes,
+        corrections_made = EXCLUDED.corrections_made,
+        continuity = EXCLUDED.continuity,
+        llm_model = EXCLUDED.llm_model,
+        processed_at = EXCLUDED.processed_at;
+    TRUNCATE tmp_steps
+"""
+
+# Failed result keys listed in the import summary
+FAIL_SAMPLE_LIMIT = 10
+
+# Imports with at least this many responses parse them in worker processes;
+# below it, pool startup and pickling cost more than the parse itself
+PARALLEL_PARSE_MIN = 5000
+PARSE_CHUNKSIZE = 256
+
+# Gemini API media download endpoint for an uploaded/result file ("files/...")
+FILE_DOWNLOAD_URL = "https://generativelanguage.googleapis.com/download/v1beta/{name}:download"
+DOWNLOAD_CHUNK_BYTES = 1 << 20
+
+
+def loads_json(text):
+    """Parse JSON, using orjson's fast parser when available.
+
+    Input orjson rejects (e.g. NaN) is retried with the stdlib parser, so
+    the same documents parse either way and errors are json.JSONDecodeError.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+
+def dumps_json(value) -> str:
+    """Serialize a value to a compact JSON string, using orjson when available."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value).decode()
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits
+    return json.dumps(value)
+
+
+def batch_cost(prompt_tokens: int, output_tokens: int) -> float:
+    """Cost in dollars of a batch request, from integer token counts (output includes thinking)."""
+    return (prompt_tokens * INPUT_CENTS_PER_M_TOKENS
+            + output_tokens * OUTPUT_CENTS_PER_M_TOKENS) / 100_000_000
+
 
 def get_db_connection():
     """Connect to PostgreSQL database."""
@@ -43,180 +172,162 @@ def get_db_connection():
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD"),
         sslmode=os.getenv("DB_SSLMODE", "require"),
+        # Detect a dropped connection during a long import instead of hanging
+        keepalives=1,
+        keepalives_idle=30,
+        keepalives_interval=10,
+        keepalives_count=3,
     )
 
 
-def prefetch_all_smiles(conn, synthesis_ids: list) -> dict:
-    """Prefetch ALL smiles data for given synthesis IDs in ONE query.
+def prefetch_all_smiles(conn, steps) -> dict:
+    """Prefetch smiles data for the given (synthesis_id, base_filename) steps.
+
+    Only the left/middle/right images of those steps are fetched, not every
+    image of their syntheses, in one query per PREFETCH_CHUNK_STEPS steps.
 
-    Returns dict: {(synthesis_id, base_filename): {reactant: {...}, reagent: {...}, product: {...}}}
+    Returns dict: {synthesis_id: {base_filename: [reactant_smiles, reagent_smiles, product_smiles]}}
     """
-    if not synthesis_ids:
-        return {}
+    cache = {}
+    steps = list(steps)
+    for start in range(0, len(steps), PREFETCH_CHUNK_STEPS):
+        _prefetch_smiles_chunk(conn, steps[start:start + PREFETCH_CHUNK_STEPS], cache)
+    return cache
 
-    with conn.cursor() as cur:
+
+def _prefetch_smiles_chunk(conn, steps: list, cache: dict):
+    """Add the smiles data of one chunk of steps to the prefetch cache."""
+    # Parallel arrays of the wanted (synthesis_id, image_filename) pairs
+    synthesis_ids = []
+    image_filenames = []
+    for synthesis_id, base_filename in steps:
+        for suffix in STEP_PARTS:
+            synthesis_ids.append(synthesis_id)
+            image_filenames.append(f"{base_filename}_{suffix}")
+
+    # Build lookup dict while streaming rows from a server-side cursor,
+    # PREFETCH_ITERSIZE per round trip, instead of materializing them all
+    with conn.cursor(name="smiles_prefetch") as cur:
+        cur.itersize = PREFETCH_ITERSIZE
         cur.execute(
             """
-            SELECT synthesis_id, image_filename, smiles, smiles_confidence
-            FROM smiles_results
-            WHERE synthesis_id = ANY(%s)
+            SELECT r.synthesis_id, r.image_filename, r.smiles
+            FROM unnest(%s::int[], %s::text[]) AS w(synthesis_id, image_filename)
+            JOIN smiles_results r
+              ON r.synthesis_id = w.synthesis_id AND r.image_filename = w.image_filename
             """,
-            (synthesis_ids,),
+            (synthesis_ids, image_filenames),
         )
-        rows = cur.fetchall()
-
-    # Build lookup dict
-    cache = {}
-    for synthesis_id, filename, smiles, confidence in rows:
-        # Extract base_filename (remove _left/_middle/_right.png suffix)
-        if filename.endswith("_left.png"):
-            base = filename[:-9]
-            part = "reactant"
-        elif filename.endswith("_middle.png"):
-            base = filename[:-11]
-            part = "reagent"
-        elif filename.endswith("_right.png"):
-            base = filename[:-10]
-            part = "product"
-        else:
-            continue
-
-        key = (synthesis_id, base)
-        if key not in cache:
-            cache[key] = {
-                "reactant": {"smiles": "", "confidence": 0},
-                "reagent": {"smiles": "", "confidence": 0},
-                "product": {"smiles": "", "confidence": 0},
-            }
-        cache[key][part] = {"smiles": smiles or "", "confidence": confidence or 0}
+        for synthesis_id, filename, smiles in cur:
+            # Extract base_filename (remove _left/_middle/_right.png suffix) with one split
+            base, sep, suffix = filename.rpartition("_")
+            part = STEP_PARTS.get(suffix)
+            if part is None or not sep:
+                continue
 
-    return cache
+            # Nested by synthesis: no (synthesis_id, base) tuple per row or lookup
+            synthesis_cache = cache.get(synthesis_id)
+            if synthesis_cache is None:
+                synthesis_cache = cache[synthesis_id] = {}
+            entry = synthesis_cache.get(base)
+            if entry is None:
+                entry = synthesis_cache[base] = ["", "", ""]
+            entry[part] = smiles or ""
 
 
-def get_smiles_from_cache(cache: dict, synthesis_id: int, base_filename: str) -> dict:
-    """Get SMILES from prefetched cache."""
-    return cache.get((synthesis_id, base_filename), {
-        "reactant": {"smiles": "", "confidence": 0},
-        "reagent": {"smiles": "", "confidence": 0},
-        "product": {"smiles": "", "confidence": 0},
-    })
+def get_smiles_from_cache(cache: dict, synthesis_id: int, base_filename: str) -> tuple:
+    """Get (reactant, reagent, product) SMILES from prefetched cache (EMPTY_SMILES for steps without results)."""
+    return cache.get(synthesis_id, _NO_STEPS).get(base_filename, EMPTY_SMILES)
 
 
 def parse_llm_response(content: str) -> dict:
     """Parse JSON from LLM response."""
-    # Try to extract JSON from code block
-    json_match = re.search(r'```(?:json)?\s*\n?(.*?)\n?```', content, re.DOTALL)
+    # Try to extract JSON from code block; without a fence marker there is
+    # nothing for the regex to find, so skip it
+    json_match = FENCE_RE.search(content) if '```' in content else None
     if json_match:
         json_str = json_match.group(1).strip()
     else:
         json_str = content.strip()
 
     try:
-        return json.loads(json_str)
+        return loads_json(json_str)
     except json.JSONDecodeError as e:
         print(f"  WARNING: Failed to parse JSON: {e}")
         return None
 
 
-def store_result(conn, synthesis_id: int, base_filename: str, existing_smiles: dict,
-                 parsed: dict, model: str):
-    """Store step data in synthesis_steps table."""
+def text_content_of(result: dict):
+    """Text of a batch result's first response part, or None if it has none."""
+    # Index straight down the happy path; a missing level is the rare case
+    try:
+        return result['response']['candidates'][0]['content']['parts'][0]['text']
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def step_fields_of(text_content: str):
+    """Parse an LLM response into its synthesis_steps columns, or None if unparsable.
+
+    Returns the corrected_reactant_smiles ... continuity columns of a row
+    (STEP_COLUMNS order), with the JSON columns already serialized.
+    """
+    parsed = parse_llm_response(text_content)
     if not parsed:
-        print(f"  Skipping {base_filename} - no parsed results")
-        return False
+        return None
 
-    image_filename = f"{base_filename}.png"
+    parsed_get = parsed.get
+    corrections = parsed_get("corrections_made", [])
+    continuity = parsed_get("continuity")
+    return (
+        parsed_get("reactant_smiles", ""),
+        parsed_get("reagent_smiles", ""),
+        parsed_get("product_smiles", ""),
+        parsed_get("reagents", ""),
+        parsed_get("conditions", ""),
+        parsed_get("yield", ""),
+        parsed_get("reaction_type", ""),
+        parsed_get("notes", ""),
+        # Most steps have no corrections; skip serializing the empty list
+        "[]" if corrections == [] else dumps_json(corrections),
+        dumps_json(continuity) if continuity else None,
+    )
+
+
+def parse_step_fields(texts: list) -> list:
+    """Apply step_fields_of to many LLM responses in order, across CPU cores for large imports."""
+    if len(texts) < PARALLEL_PARSE_MIN:
+        return [step_fields_of(text) for text in texts]
+    with ProcessPoolExecutor() as executor:
+        return list(executor.map(step_fields_of, texts, chunksize=PARSE_CHUNKSIZE))
 
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO synthesis_steps (
-                synthesis_id, image_filename,
-                original_reactant_smiles, original_reagent_smiles, original_product_smiles,
-                corrected_reactant_smiles, corrected_reagent_smiles, corrected_product_smiles,
-                reagents, conditions, yield, reaction_type, notes,
-                corrections_made, continuity,
-                llm_model, llm_cost, tokens_used, processed_at
-            ) VALUES (
-                %s, %s,
-                %s, %s, %s,
-                %s, %s, %s,
-                %s, %s, %s, %s, %s,
-                %s, %s,
-                %s, %s, %s, %s
-            )
-            ON CONFLICT (synthesis_id, image_filename) DO UPDATE SET
-                corrected_reactant_smiles = EXCLUDED.corrected_reactant_smiles,
-                corrected_reagent_smiles = EXCLUDED.corrected_reagent_smiles,
-                corrected_product_smiles = EXCLUDED.corrected_product_smiles,
-                reagents = EXCLUDED.reagents,
-                conditions = EXCLUDED.conditions,
-                yield = EXCLUDED.yield,
-                reaction_type = EXCLUDED.reaction_type,
-                notes = EXCLUDED.notes,
-                corrections_made = EXCLUDED.corrections_made,
-                continuity = EXCLUDED.continuity,
-                llm_model = EXCLUDED.llm_model,
-                processed_at = EXCLUDED.processed_at
-            """,
-            (
-                synthesis_id, image_filename,
-                existing_smiles["reactant"]["smiles"],
-                existing_smiles["reagent"]["smiles"],
-                existing_smiles["product"]["smiles"],
-                parsed.get("reactant_smiles", ""),
-                parsed.get("reagent_smiles", ""),
-                parsed.get("product_smiles", ""),
-                parsed.get("reagents", ""),
-                parsed.get("conditions", ""),
-                parsed.get("yield", ""),
-                parsed.get("reaction_type", ""),
-                parsed.get("notes", ""),
-                json.dumps(parsed.get("corrections_made", [])),
-                json.dumps(parsed.get("continuity")) if parsed.get("continuity") else None,
-                model,
-                None,  # Cost not available from batch
-                None,  # Tokens not available from batch
-                datetime.now(),
-            ),
-        )
 
-    return True
+def write_copy_row(writer, row: tuple):
+    """Append one synthesis_steps row (STEP_COLUMNS order) to a COPY CSV buffer."""
+    writer.writerow([COPY_NULL if value is None else value for value in row])
 
 
-def _batch_insert(conn, rows: list):
-    """Batch insert rows using executemany with ON CONFLICT handling."""
-    if not rows:
+def _batch_insert(conn, buf: io.StringIO):
+    """Upsert the rows in a COPY CSV buffer (see write_copy_row) into synthesis_steps.
+
+    The rows are streamed with COPY FROM STDIN into a temp staging table and
+    merged with one INSERT ... SELECT ... ON CONFLICT, so the server parses
+    CSV instead of a huge VALUES list. The buffer is emptied afterwards.
+    """
+    if not buf.tell():
         return
 
     with conn.cursor() as cur:
-        # Use execute_values for better performance with PostgreSQL
-        from psycopg2.extras import execute_values
-
-        sql = """
-            INSERT INTO synthesis_steps (
-                synthesis_id, image_filename,
-                original_reactant_smiles, original_reagent_smiles, original_product_smiles,
-                corrected_reactant_smiles, corrected_reagent_smiles, corrected_product_smiles,
-                reagents, conditions, yield, reaction_type, notes,
-                corrections_made, continuity,
-                llm_model, llm_cost, tokens_used, processed_at
-            ) VALUES %s
-            ON CONFLICT (synthesis_id, image_filename) DO UPDATE SET
-                corrected_reactant_smiles = EXCLUDED.corrected_reactant_smiles,
-                corrected_reagent_smiles = EXCLUDED.corrected_reagent_smiles,
-                corrected_product_smiles = EXCLUDED.corrected_product_smiles,
-                reagents = EXCLUDED.reagents,
-                conditions = EXCLUDED.conditions,
-                yield = EXCLUDED.yield,
-                reaction_type = EXCLUDED.reaction_type,
-                notes = EXCLUDED.notes,
-                corrections_made = EXCLUDED.corrections_made,
-                continuity = EXCLUDED.continuity,
-                llm_model = EXCLUDED.llm_model,
-                processed_at = EXCLUDED.processed_at
-        """
-        execute_values(cur, sql, rows)
+        cur.execute(STAGE_CREATE_SQL)
+
+        buf.seek(0)
+        cur.copy_expert(STAGE_COPY_SQL, buf)
+
+        # Merge and empty the staging table in one round trip
+        cur.execute(STAGE_MERGE_SQL)
+
+    buf.seek(0)
+    buf.truncate()
 
 
 def check_status(client, job_name: str) -> dict:
@@ -240,173 +351,235 @@ def download_results(client, job_name: str, output_file: str = None) -> str:
 
     print("\nDownloading results...")
     dest_file_name = dest_file.file_name if hasattr(dest_file, 'file_name') else str(dest_file)
-    results_content = client.files.download(file=dest_file_name)
 
     # Determine output filename
     if not output_file:
         output_file = f"results_{job_name.split('/')[-1][:12]}.jsonl"
 
     output_path = Path(__file__).parent / output_file
-    output_path.write_bytes(results_content)
 
-    line_count = len(results_content.decode('utf-8').strip().split('\n'))
+    if httpx is not None:
+        line_count = _stream_download(dest_file_name, output_path)
+    else:
+        # The SDK only returns the whole file as bytes
+        results_content = client.files.download(file=dest_file_name)
+        output_path.write_bytes(results_content)
+        # Count lines on the raw bytes instead of decoding and splitting a copy
+        line_count = results_content.strip().count(b'\n') + 1
+
     print(f"Saved {line_count} results to {output_path}")
     return str(output_path)
 
 
+def _stream_download(file_name: str, output_path: Path) -> int:
+    """Stream a Gemini file straight to disk. Returns its line count.
+
+    client.files.download() buffers the whole body in memory, which for
+    large batch outputs is several GB; this keeps memory constant.
+    """
+    line_count = 0
+    last_byte = b'\n'
+    with httpx.stream(
+        "GET",
+        FILE_DOWNLOAD_URL.format(name=file_name),
+        params={"alt": "media"},
+        headers={"x-goog-api-key": os.getenv("GOOGLE_API_KEY", "")},
+        follow_redirects=True,
+        timeout=httpx.Timeout(60.0, read=300.0),
+    ) as response:
+        response.raise_for_status()
+        with open(output_path, 'wb') as f:
+            for chunk in response.iter_bytes(DOWNLOAD_CHUNK_BYTES):
+                if not chunk:
+                    continue
+                f.write(chunk)
+                line_count += chunk.count(b'\n')
+                last_byte = chunk[-1:]
+
+    # The last line usually has no trailing newline
+    if last_byte != b'\n':
+        line_count += 1
+    return line_count
+
+
 def import_from_file(file_path: str):
     """Import results from a local JSONL file into the database."""
     print(f"Loading results from {file_path}...")
 
-    with open(file_path, 'r') as f:
-        results_text = f.read()
-
+    # Parse line by line, so the raw text is never held in memory next to
+    # the parsed results. Lines stay bytes: orjson parses UTF-8 directly,
+    # without a separate decode to str
     results = []
-    for line in results_text.strip().split('\n'):
-        if line:
-            results.append(json.loads(line))
+    with open(file_path, 'rb', buffering=1 << 20) as f:
+        for line in f:
+            if line.strip():
+                results.append(loads_json(line))
 
     print(f"Loaded {len(results)} results")
     _import_results_to_db(results)
 
 
 def _import_results_to_db(results: list):
-    """Import parsed results into database."""
+    """Import parsed results into database.
+
+    Full batches are upserted on a background thread while the next batch
+    is parsed; psycopg2 releases the GIL while it waits on the server. At
+    most one batch is in flight, and the main thread does not touch the
+    connection meanwhile.
+    """
+    # Parse every key ("3829_sequence_01") once into (synthesis_id, base_filename),
+    # or None if malformed; used for the prefetch and the main loop
+    parsed_keys = []
+    for result in results:
+        id_part, sep, base_filename = result.get('key', '').partition('_')
+        parsed_keys.append((int(id_part), base_filename) if sep else None)
+    steps = {parsed_key for parsed_key in parsed_keys if parsed_key}
+
+    # Decode the LLM responses of valid results into row columns up front, before the
+    # connection and insert thread exist (worker processes may be forked)
+    texts = [text_content_of(result) if parsed_key else None
+             for result, parsed_key in zip(results, parsed_keys)]
+    print(f"\nParsing {len(results)} responses...")
+    parsed_step_fields = iter(parse_step_fields([text for text in texts if text is not None]))
+
     conn = get_db_connection()
+    insert_executor = ThreadPoolExecutor(max_workers=1)
+    pending_insert = None
 
     try:
-        # Extract all synthesis IDs from results for prefetch
-        synthesis_ids = set()
-        for result in results:
-            key = result.get('key', '')
-            parts = key.split('_', 1)
-            if len(parts) == 2:
-                synthesis_ids.add(int(parts[0]))
+        # The import is one transaction and a failed import is simply re-run,
+        # so its commit need not wait for the WAL flush
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL synchronous_commit = off")
+
+        synthesis_count = len({synthesis_id for synthesis_id, _ in steps})
 
-        # Prefetch ALL smiles in ONE query
-        print(f"\nPrefetching SMILES for {len(synthesis_ids)} syntheses...")
-        smiles_cache = prefetch_all_smiles(conn, list(synthesis_ids))
-        print(f"Loaded {len(smiles_cache)} step records into cache")
+        # Prefetch the steps' smiles up front (a few chunked queries)
+        print(f"\nPrefetching SMILES for {len(steps)} steps in {synthesis_count} syntheses...")
+        smiles_cache = prefetch_all_smiles(conn, steps)
+        step_record_count = sum(len(synthesis_cache) for synthesis_cache in smiles_cache.values())
+        print(f"Loaded {step_record_count} step records into cache")
 
         success_count = 0
-        fail_count = 0
-        batch_data = []  # Collect data for batch insert
-        BATCH_SIZE = 500
+        # Failures are tallied per reason, with a few sample keys, and
+        # reported once at the end instead of printed one by one
+        fail_reasons = {}
+        fail_samples = []
+
+        def record_failure(reason, key):
+            fail_reasons[reason] = fail_reasons.get(reason, 0) + 1
+            if len(fail_samples) < FAIL_SAMPLE_LIMIT:
+                fail_samples.append((reason, key))
+
+        # Rows are written straight into a COPY CSV buffer for batch upsert
+        batch_buf = io.StringIO()
+        batch_writer = csv.writer(batch_buf)
+        batch_rows = 0
+        BATCH_SIZE = 5000
 
         # Token tracking
         total_prompt_tokens = 0
         total_output_tokens = 0
         total_thinking_tokens = 0
         total_cached_tokens = 0
-        total_cost = 0.0
+
+        # One processed_at for the whole import: every row belongs to the same run.
+        # Pre-formatted for COPY, so the CSV writer does not format it per row
+        processed_at = datetime.now().isoformat(sep=' ')
 
         print("\nProcessing results...")
-        for i, result in enumerate(results):
+        for i, (result, parsed_key, text_content) in enumerate(zip(results, parsed_keys, texts)):
             key = result.get('key', '')
             response = result.get('response', {})
 
-            # Parse key: "3829_sequence_01"
-            parts = key.split('_', 1)
-            if len(parts) != 2:
-                print(f"  Invalid key format: {key}")
-                fail_count += 1
+            if parsed_key is None:
+                record_failure("Invalid key format", key)
                 continue
 
-            synthesis_id = int(parts[0])
-            base_filename = parts[1]
+            synthesis_id, base_filename = parsed_key
 
-            # Get response content
-            candidates = response.get('candidates', [])
-            if not candidates:
-                print(f"  No candidates for {key}")
-                fail_count += 1
+            # Report why a response has no content
+            if text_content is None:
+                if not response.get('candidates'):
+                    record_failure("No candidates", key)
+                else:
+                    record_failure("No content", key)
                 continue
 
-            content_parts = candidates[0].get('content', {}).get('parts', [])
-            if not content_parts:
-                print(f"  No content for {key}")
-                fail_count += 1
+            # LLM response parsed up front, in result order
+            step_fields = next(parsed_step_fields)
+            if step_fields is None:
+                record_failure("No parsed results", key)
                 continue
 
-            text_content = content_parts[0].get('text', '')
+            # Extract token usage from response
+            usage_get = response.get('usageMetadata', {}).get
+            prompt_tokens = usage_get('promptTokenCount', 0)
+            output_tokens = usage_get('candidatesTokenCount', 0)
+            thinking_tokens = usage_get('thoughtsTokenCount', 0)
 
-            # Parse LLM response
-            parsed = parse_llm_response(text_content)
-            if not parsed:
-                print(f"  Skipping {base_filename} - no parsed results")
-                fail_count += 1
-                continue
+            # Thinking tokens are billed as output
+            llm_cost = batch_cost(prompt_tokens, output_tokens + thinking_tokens)
 
-            # Extract token usage from response
-            usage = response.get('usageMetadata', {})
-            tokens_used = {
-                "prompt": usage.get('promptTokenCount', 0),
-                "output": usage.get('candidatesTokenCount', 0),
-                "thinking": usage.get('thoughtsTokenCount', 0),
-                "cached": usage.get('cachedContentTokenCount', 0),
-                "total": usage.get('totalTokenCount', 0),
-            }
-
-            # Calculate cost (Gemini 3 Flash batch pricing: 50% discount)
-            # Input: $0.25/1M, Output: $1.50/1M (includes thinking)
-            input_cost = (tokens_used["prompt"] / 1_000_000) * 0.25
-            output_cost = ((tokens_used["output"] + tokens_used["thinking"]) / 1_000_000) * 1.50
-            llm_cost = input_cost + output_cost
-
-            # Accumulate totals
-            total_prompt_tokens += tokens_used["prompt"]
-            total_output_tokens += tokens_used["output"]
-            total_thinking_tokens += tokens_used["thinking"]
-            total_cached_tokens += tokens_used["cached"]
-            total_cost += llm_cost
+            # Accumulate totals (integers; the total cost is computed once at the end)
+            total_prompt_tokens += prompt_tokens
+            total_output_tokens += output_tokens
+            total_thinking_tokens += thinking_tokens
+            total_cached_tokens += usage_get('cachedContentTokenCount', 0)
 
             # Get original SMILES from prefetched cache (O(1) lookup)
-            existing_smiles = get_smiles_from_cache(smiles_cache, synthesis_id, base_filename)
+            original_reactant, original_reagent, original_product = get_smiles_from_cache(
+                smiles_cache, synthesis_id, base_filename)
 
             # Prepare row for batch insert
-            image_filename = f"{base_filename}.png"
             row = (
-                synthesis_id, image_filename,
-                existing_smiles["reactant"]["smiles"],
-                existing_smiles["reagent"]["smiles"],
-                existing_smiles["product"]["smiles"],
-                parsed.get("reactant_smiles", ""),
-                parsed.get("reagent_smiles", ""),
-                parsed.get("product_smiles", ""),
-                parsed.get("reagents", ""),
-                parsed.get("conditions", ""),
-                parsed.get("yield", ""),
-                parsed.get("reaction_type", ""),
-                parsed.get("notes", ""),
-                json.dumps(parsed.get("corrections_made", [])),
-                json.dumps(parsed.get("continuity")) if parsed.get("continuity") else None,
-                "gemini-3-flash-batch",
+                synthesis_id, base_filename + ".png",
+                original_reactant, original_reagent, original_product,
+                *step_fields,
+                BATCH_MODEL,
                 llm_cost,
-                tokens_used["total"],
-                datetime.now(),
+                usage_get('totalTokenCount', 0),
+                processed_at,
             )
-            batch_data.append(row)
+            write_copy_row(batch_writer, row)
+            batch_rows += 1
             success_count += 1
 
-            # Insert batch when full
-            if len(batch_data) >= BATCH_SIZE:
-                _batch_insert(conn, batch_data)
+            # Insert batch in the background when full, after the previous
+            # one has finished (which also surfaces its errors)
+            if batch_rows >= BATCH_SIZE:
+                if pending_insert is not None:
+                    pending_insert.result()
+                pending_insert = insert_executor.submit(_batch_insert, conn, batch_buf)
                 progress = (i + 1) / len(results) * 100
-                print(f"  Inserted {len(batch_data)} rows ({progress:.1f}% complete)")
-                batch_data = []
+                print(f"  Inserting {batch_rows} rows ({progress:.1f}% complete)")
+                batch_buf = io.StringIO()
+                batch_writer = csv.writer(batch_buf)
+                batch_rows = 0
+
+        if pending_insert is not None:
+            pending_insert.result()
 
         # Insert remaining rows
-        if batch_data:
-            _batch_insert(conn, batch_data)
-            print(f"  Inserted final {len(batch_data)} rows (100% complete)")
+        if batch_rows:
+            _batch_insert(conn, batch_buf)
+            print(f"  Inserted final {batch_rows} rows (100% complete)")
 
         conn.commit()
 
+        total_cost = batch_cost(total_prompt_tokens, total_output_tokens + total_thinking_tokens)
+
         print(f"\n{'='*60}")
         print(f"RESULTS IMPORTED")
         print(f"{'='*60}")
         print(f"Success: {success_count}")
-        print(f"Failed: {fail_count}")
+        print(f"Failed: {sum(fail_reasons.values())}")
+        for reason, count in fail_reasons.items():
+            print(f"  {reason}: {count}")
+        if fail_samples:
+            print("First failures:")
+            for reason, key in fail_samples:
+                print(f"  {key}: {reason}")
         print(f"Total: {len(results)}")
         print(f"\n{'='*60}")
         print(f"TOKEN USAGE & COST")
@@ -419,6 +592,8 @@ def _import_results_to_db(results: list):
         print(f"Total cost:      ${total_cost:.4f}")
 
     finally:
+        # Let an in-flight insert finish before the connection goes away
+        insert_executor.shutdown(wait=True)
         conn.close()
 
 
@@ -454,7 +629,7 @@ def collect_results(job_name: str, status_only: bool = False, download_only: boo
 
     # Update batch jobs tracking
     if BATCH_JOBS_FILE.exists():
-        jobs = json.loads(BATCH_JOBS_FILE.read_text())
+        jobs = loads_json(BATCH_JOBS_FILE.read_bytes())
         if job_name in jobs:
             jobs[job_name]['status'] = 'collected'
             jobs[job_name]['collected_at'] = datetime.now().isoformat()
@@ -47,6 +47,9 @@ DEFAULT_BASE_PATH = "/mnt/d/chemistry-scraped"
 # Batch job tracking file
 BATCH_JOBS_FILE = Path(__file__).parent / "batch_jobs.json"
 
+# Split image suffix (after the last "_") -> step part it holds
+STEP_PARTS = {"left.png": "reactant", "middle.png": "reagent", "right.png": "product"}
+
 
 def get_db_connection():
     """Connect to PostgreSQL database."""
@@ -182,40 +185,44 @@ def get_steps_for_synthesis(conn, synthesis_id: int) -> list:
     return [row[0] for row in rows]
 
 
-def fetch_smiles_for_image(conn, synthesis_id: int, base_filename: str) -> dict:
-    """Fetch 3 SMILES records from DB for a given image."""
-    filenames = [
-        f"{base_filename}_left.png",
-        f"{base_filename}_middle.png",
-        f"{base_filename}_right.png",
-    ]
+def empty_smiles() -> dict:
+    """SMILES record for a step with no DECIMER results."""
+    return {
+        "reactant": {"smiles": "", "confidence": 0},
+        "reagent": {"smiles": "", "confidence": 0},
+        "product": {"smiles": "", "confidence": 0},
+    }
+
+
+def fetch_smiles_for_synthesis(conn, synthesis_id: int) -> dict:
+    """Fetch the SMILES records of all steps of a synthesis in one query.
 
+    Returns dict: {base_filename: {reactant: {...}, reagent: {...}, product: {...}}}
+    """
     with conn.cursor() as cur:
         cur.execute(
             """
             SELECT image_filename, smiles, smiles_confidence
             FROM smiles_results
-            WHERE synthesis_id = %s AND image_filename IN %s
+            WHERE synthesis_id = %s
             """,
-            (synthesis_id, tuple(filenames)),
+            (synthesis_id,),
         )
-        rows = cur.fetchall()
 
-    result = {
-        "reactant": {"smiles": "", "confidence": 0},
-        "reagent": {"smiles": "", "confidence": 0},
-        "product": {"smiles": "", "confidence": 0},
-    }
+        # Build the records straight off the cursor, without a fetchall() list
+        results = {}
+        for filename, smiles, confidence in cur:
+            # Split off the _left/_middle/_right.png suffix once and look it up
+            base, sep, suffix = filename.rpartition("_")
+            part = STEP_PARTS.get(suffix)
+            if part is None or not sep:
+                continue
 
-    for filename, smiles, confidence in rows:
-        if filename.endswith("_left.png"):
-            result["reactant"] = {"smiles": smiles or "", "confidence": confidence or 0}
-        elif filename.endswith("_middle.png"):
-            result["reagent"] = {"smiles": smiles or "", "confidence": confidence or 0}
-        elif filename.endswith("_right.png"):
-            result["product"] = {"smiles": smiles or "", "confidence": confidence or 0}
+            if base not in results:
+                results[base] = empty_smiles()
+            results[base][part] = {"smiles": smiles or "", "confidence": confidence or 0}
 
-    return result
+    return results
 
 
 def load_prompt() -> str:
@@ -266,6 +273,8 @@ def build_batch_requests(synthesis_ids: list, base_path: str, prompt: str) -> li
         for synthesis_id in synthesis_ids:
             synthesis_name = get_synthesis_name(conn, synthesis_id)
             steps = get_steps_for_synthesis(conn, synthesis_id)
+            # Existing SMILES for every step, in one query instead of one per image
+            synthesis_smiles = fetch_smiles_for_synthesis(conn, synthesis_id)
 
             print(f"\n{synthesis_name} (ID: {synthesis_id}): {len(steps)} steps")
 
@@ -276,8 +285,8 @@ def build_batch_requests(synthesis_ids: list, base_path: str, prompt: str) -> li
                     print(f"  WARNING: Image not found: {image_path}")
                     continue
 
-                # Fetch existing SMILES
-                existing_smiles = fetch_smiles_for_image(conn, synthesis_id, base_filename)
+                # Look up existing SMILES
+                existing_smiles = synthesis_smiles.get(base_filename) or empty_smiles()
 
                 # Build request key (used to match results later)
                 key = f"{synthesis_id}_{base_filename}"
@@ -35,6 +35,9 @@ MODELS = {
 # Default base path for images (WSL path)
 DEFAULT_BASE_PATH = "/mnt/d/chemistry-scraped"
 
+# JSON wrapped in a markdown code fence, as LLM responses often are
+FENCE_RE = re.compile(r'```(?:json)?\s*\n?(.*?)\n?```', re.DOTALL)
+
 
 def get_db_connection():
     """Connect to PostgreSQL database."""
@@ -216,7 +219,7 @@ def parse_llm_response(content: str) -> dict:
     Handles responses with markdown code blocks.
     """
     # Try to extract JSON from code block
-    json_match = re.search(r'```(?:json)?\s*\n?(.*?)\n?```', content, re.DOTALL)
+    json_match = FENCE_RE.search(content)
     if json_match:
         json_str = json_match.group(1).strip()
     else: